@@ -0,0 +1,177 @@
+"""
+Several LoRA adapters served from one shared base model.
+
+The base model is loaded once and each adapter is attached to it by name
+(PEFT's load_adapter), so an extra fine-tune costs only its adapter weights.
+Requests are routed to an adapter by weighted traffic split; a chat keeps the
+adapter it was first routed to. The batch scheduler generates each batch with
+a single adapter active, and adapters can be loaded, unloaded and re-weighted
+at runtime under the same lock the scheduler holds while generating.
+
+    AUTISM_ADAPTERS="main=autism_guidance_gemma_2b:0.9,ckpt102=autism_guidance_gemma_2b/checkpoint-102:0.1"
+
+The name `base` routes to the base model with adapters disabled ("base:0.1").
+"""
+
+import hashlib
+import random
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+BASE = 'base'
+
+
+def parse_adapter_spec(spec: str) -> dict:
+    """Parse 'name=path[:weight],...' into {name: (path, weight)}, keeping order."""
+    adapters = {}
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        name, eq, target = entry.partition('=')
+        if not eq:
+            # Only the base model needs no path
+            name, target = entry.partition(':')[0], entry
+            if name != BASE:
+                raise ValueError(f'Adapter entry must be name=path[:weight]: {entry!r}')
+        path, sep, weight = target.rpartition(':')
+        if not sep:
+            path, weight = target, '1'
+        try:
+            weight = float(weight)
+        except ValueError:
+            raise ValueError(f'Bad adapter weight in {entry!r}') from None
+        name = name.strip()
+        if name in adapters:
+            raise ValueError(f'Duplicate adapter name: {name!r}')
+        if weight < 0:
+            raise ValueError(f'Adapter weight must be >= 0: {entry!r}')
+        adapters[name] = (BASE if name == BASE else path.strip(), weight)
+    if not set(adapters) - {BASE}:
+        raise ValueError('At least one adapter besides base is required')
+    return adapters
+
+
+def hash_point(key: str) -> float:
+    """Map a key to a stable point in [0, 1)."""
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+class AdapterRouter:
+    """Routing table for named adapters on one PEFT model, plus runtime load/unload.
+
+    Routing works from the table alone, so requests can be assigned before the
+    model has loaded; `bind` attaches the model once it is ready.
+    """
+
+    def __init__(self, adapters: dict, local_files_only: bool = False):
+        self.paths = {name: path for name, (path, _) in adapters.items()}
+        self.weights = {name: weight for name, (_, weight) in adapters.items()}
+        self.local_files_only = local_files_only
+        self.model = None
+        # Held by the scheduler for each batch and by load/unload, so the
+        # adapter set never changes under a running generate call
+        self.lock = threading.RLock()
+        self._routes_lock = threading.Lock()
+        self._active = None
+        self.routed = Counter()
+        self.generated = Counter()
+
+    def bind(self, model):
+        """Attach the model whose adapters this router switches between."""
+        with self.lock:
+            self.model = model
+            self._active = None
+
+    @property
+    def default(self) -> str:
+        """The first adapter listed; used when no adapter has traffic weight."""
+        with self._routes_lock:
+            return next(iter(self.paths))
+
+    @property
+    def names(self) -> list:
+        with self._routes_lock:
+            return list(self.paths)
+
+    def route(self, session_id: str = None) -> str:
+        """Pick an adapter by weight; a session id always maps to the same point."""
+        point = hash_point(session_id) if session_id is not None else random.random()
+        with self._routes_lock:
+            weighted = [(name, weight) for name, weight in self.weights.items() if weight > 0]
+            total = sum(weight for _, weight in weighted)
+            name = next(iter(self.paths))
+            cumulative = 0.0
+            for candidate, weight in weighted:
+                cumulative += weight / total
+                name = candidate
+                if point < cumulative:
+                    break
+            self.routed[name] += 1
+            return name
+
+    @contextmanager
+    def use(self, name: str, rows: int = 1):
+        """Hold the model lock with `name` active (adapters disabled for `base`)."""
+        with self.lock:
+            if name is None:
+                name = self.default
+            if name not in self.paths:
+                raise KeyError(f'Unknown adapter: {name}')
+            if name == BASE:
+                context = self.model.disable_adapter() if hasattr(self.model, 'disable_adapter') else nullcontext()
+            else:
+                if name != self._active:
+                    self.model.set_adapter(name)
+                    self._active = name
+                context = nullcontext()
+            with self._routes_lock:
+                self.generated[name] += rows
+            with context:
+                yield
+
+    def load(self, name: str, path: str, weight: float = 0.0):
+        """Attach another adapter at runtime; it gets no traffic until weighted."""
+        if weight < 0:
+            raise ValueError('Adapter weight must be >= 0')
+        with self.lock:
+            if name in self.paths:
+                raise ValueError(f'Adapter already loaded: {name}')
+            if name != BASE:
+                if self.model is None:
+                    raise RuntimeError('Model is not loaded yet')
+                self.model.load_adapter(path, adapter_name=name, local_files_only=self.local_files_only)
+            with self._routes_lock:
+                self.paths[name] = BASE if name == BASE else path
+                self.weights[name] = weight
+
+    def unload(self, name: str):
+        """Stop routing to an adapter and free its weights; the last adapter stays."""
+        with self.lock:
+            if name not in self.paths:
+                raise KeyError(f'Unknown adapter: {name}')
+            if sum(1 for other in self.paths if other != BASE) == 1 and name != BASE:
+                raise ValueError('Cannot unload the last adapter')
+            with self._routes_lock:
+                del self.paths[name]
+                del self.weights[name]
+            if name != BASE and self.model is not None:
+                self.model.delete_adapter(name)
+                if self._active == name:
+                    self._active = None
+
+    def set_weights(self, weights: dict):
+        """Replace traffic weights; adapters left out get no new traffic."""
+        with self._routes_lock:
+            unknown = set(weights) - set(self.paths)
+            if unknown:
+                raise KeyError(f'Unknown adapter(s): {", ".join(sorted(unknown))}')
+            if any(weight < 0 for weight in weights.values()):
+                raise ValueError('Adapter weights must be >= 0')
+            self.weights = {name: float(weights.get(name, 0.0)) for name in self.paths}
+
+    def describe(self) -> list:
+        """One entry per adapter: path, weight and request counts."""
+        with self._routes_lock:
+            return [{'name': name, 'path': path, 'weight': self.weights[name],
+                     'routed': self.routed[name], 'generated': self.generated[name]}
+                    for name, path in self.paths.items()]
@@ -0,0 +1,196 @@
+"""
+Bounded answer cache for the chatbot.
+Questions are keyed by a normalized form (case, whitespace and punctuation
+folded); an optional near-duplicate tier compares hashed character n-gram
+vectors, and only counts a match when both questions carry the same numbers
+and negations ("2-year-old" vs "3-year-old", "no eye contact" vs "eye
+contact" look alike to n-grams). Entries are evicted LRU with a TTL and can
+be persisted to disk, tagged with the model that generated them.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+NGRAM_SIZE = 3
+HASH_DIM = 1 << 20
+
+# "doesn't" normalizes to "doesn t", so a lone "t" marks a contracted negation
+NEGATIONS = frozenset('''
+    no not never none nor neither nothing nobody without cannot t
+    dont doesnt didnt isnt arent wasnt werent cant couldnt wont wouldnt shouldnt hasnt havent
+'''.split())
+NUMBER_WORDS = frozenset('''
+    zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen
+    fifteen sixteen seventeen eighteen nineteen twenty thirty forty fifty half
+'''.split())
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, punctuation and whitespace so trivially different questions match."""
+    text = unicodedata.normalize('NFKC', question).casefold()
+    text = ''.join(' ' if unicodedata.category(ch).startswith('P') else ch for ch in text)
+    return ' '.join(text.split())
+
+
+def guard_terms(key: str) -> tuple:
+    """Numbers and negations in a normalized question; near-duplicates must agree on these."""
+    return tuple(sorted(word for word in key.split()
+                        if word in NEGATIONS or word in NUMBER_WORDS or any(ch.isdigit() for ch in word)))
+
+
+def ngram_vector(key: str) -> dict:
+    """L2-normalised sparse vector of hashed character n-grams."""
+    padded = f' {key} '
+    counts = {}
+    for i in range(max(1, len(padded) - NGRAM_SIZE + 1)):
+        slot = zlib.crc32(padded[i:i + NGRAM_SIZE].encode('utf-8')) % HASH_DIM
+        counts[slot] = counts.get(slot, 0) + 1
+    norm = math.sqrt(sum(v * v for v in counts.values()))
+    return {slot: v / norm for slot, v in counts.items()}
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(slot, 0.0) for slot, v in a.items())
+
+
+class AnswerCache:
+    """LRU + TTL cache of generated answers with optional near-duplicate lookup.
+
+    `model_key` identifies the weights that produced the answers; a persisted
+    file written under a different key is discarded on load.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 24 * 3600,
+                 similarity_threshold: float = 0.9, path: str = None, model_key: str = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.path = path
+        self.model_key = model_key
+        self._entries = OrderedDict()   # key -> {'answer', 'created', 'vector', 'guards'}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, question: str):
+        """Return a cached answer for the question, or None."""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['answer']
+
+            if self.similarity_threshold is not None:
+                match = self._nearest(key, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.near_hits += 1
+                    return self._entries[match]['answer']
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, answer: str, created: float = None):
+        """Store an answer, evicting the least recently used entry if full."""
+        key = normalize_question(question)
+        if not key:
+            return
+        with self._lock:
+            self._entries[key] = {
+                'answer': answer,
+                'created': time.time() if created is None else created,
+                'vector': ngram_vector(key) if self.similarity_threshold is not None else None,
+                'guards': guard_terms(key),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and current size."""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def save(self, path: str = None):
+        """Write unexpired entries to disk (atomically) so a restart begins warm."""
+        path = path or self.path
+        if not path:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [
+                {'key': key, 'answer': e['answer'], 'created': e['created']}
+                for key, e in self._entries.items() if not self._expired(e, now)
+            ]
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'model_key': self.model_key, 'entries': entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str = None) -> int:
+        """Load persisted entries, skipping expired ones. Returns count loaded."""
+        path = path or self.path
+        if not path or not Path(path).exists():
+            return 0
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('model_key') != self.model_key:
+            # Answers from other weights; the next save overwrites the file
+            return 0
+        now = time.time()
+        loaded = 0
+        # Entries were saved oldest-first in LRU order, so re-inserting preserves it
+        for e in data.get('entries', []):
+            if self.ttl_seconds is not None and now - e['created'] > self.ttl_seconds:
+                continue
+            self.put(e['key'], e['answer'], created=e['created'])
+            loaded += 1
+        return loaded
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry['created'] > self.ttl_seconds
+
+    def _nearest(self, key: str, now: float):
+        """Most similar unexpired key above the threshold (caller holds the lock)."""
+        vector = ngram_vector(key)
+        guards = guard_terms(key)
+        best_key, best_score = None, self.similarity_threshold
+        for other, entry in self._entries.items():
+            if entry['vector'] is None or entry['guards'] != guards or self._expired(entry, now):
+                continue
+            score = _cosine(vector, entry['vector'])
+            if score >= best_score:
+                best_key, best_score = other, score
+        return best_key
@@ -1,58 +1,190 @@
 """
 Gradio UI for Autism Screening Guidance Chatbot.
 Run after fine-tuning: python app.py
-Loads the fine-tuned Gemma-2B-IT model from autism_guidance_gemma_2b/
+Loads the fine-tuned Gemma-2B-IT model from autism_guidance_gemma_2b/ (or the
+Hub adapter) in the background; a merged export is used when present.
 """
 
+import atexit
+import logging
+import os
+import threading
+from pathlib import Path
+
 import gradio as gr
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
-from peft import PeftModel
+
+import metrics
+from adapters import AdapterRouter, parse_adapter_spec
+from answer_cache import AnswerCache
+from batching import BatchScheduler
+from guardrails import ALLOWED, BLOCKED, GuardrailEngine
+from model_manager import (
+    IDLE, LOADING, LOCAL_ADAPTER_DIR, MERGED_MODEL_DIR, ModelManager, resolve_adapter_path,
+)
+from prompts import build_prompt
+from retrieval import RetrievalIndex
+from sessions import SessionStore
+
+# Bundled files resolve from this file, so the app can be imported from any directory
+ROOT = Path(__file__).resolve().parent
 
 MODEL_NAME = "google/gemma-2b-it"
-ADAPTER_PATH = "Rele22/autism-guidance-gemma-2b"
+ADAPTER_PATH = os.environ.get('AUTISM_ADAPTER_PATH') or resolve_adapter_path(str(ROOT / LOCAL_ADAPTER_DIR))
+MERGED_MODEL_PATH = os.environ.get('AUTISM_MERGED_PATH', str(ROOT / MERGED_MODEL_DIR))
+OFFLINE = os.environ.get('HF_HUB_OFFLINE', '0') == '1'
+BACKEND = os.environ.get('AUTISM_BACKEND', 'auto')   # gpu-4bit, cpu-int8, cpu, tiny or auto
+# Several adapters on one base model, e.g. "main=autism_guidance_gemma_2b:0.9,ckpt102=...:0.1"
+ADAPTERS = parse_adapter_spec(os.environ['AUTISM_ADAPTERS']) if os.environ.get('AUTISM_ADAPTERS') else None
+ADMIN_TOKEN = os.environ.get('AUTISM_ADMIN_TOKEN')   # enables the /admin/adapters endpoints
+HOST = os.environ.get('AUTISM_HOST', '127.0.0.1')   # 0.0.0.0 serves on every interface
+PORT = int(os.environ.get('AUTISM_PORT', '7860'))
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
-# Load tokenizer
-print("Loading tokenizer...")
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-tokenizer.pad_token = tokenizer.eos_token
-tokenizer.padding_side = 'right'
-
-# Load base model with 4-bit quantization for efficiency
-print("Loading base model...")
-bnb_config = BitsAndBytesConfig(
-    load_in_4bit=True,
-    bnb_4bit_quant_type='nf4',
-    bnb_4bit_compute_dtype=torch.bfloat16,
-    bnb_4bit_use_double_quant=True,
-)
+MAX_NEW_TOKENS = 512
+
+# Request batching: concurrent chats share one model.generate call
+MAX_BATCH_SIZE = 8
+MAX_BATCH_WAIT_MS = 20
+MAX_QUEUE_SIZE = 64
+
+# Answer cache: repeated questions skip generation entirely
+ANSWER_CACHE_PATH = str(ROOT / 'cache' / 'answers.json')
+ANSWER_CACHE_SIZE = 1024
+ANSWER_CACHE_TTL_SECONDS = 24 * 3600
+ANSWER_CACHE_SIMILARITY = 0.9
+
+# Retrieval over the curated corpus: near-identical questions get the curated
+# answer without a model call, related ones get passages added to the prompt
+RETRIEVAL_INDEX_DIR = os.environ.get('AUTISM_RETRIEVAL_INDEX', str(ROOT / 'data' / 'index'))
+RETRIEVAL_CORPUS_PATH = str(ROOT / 'data' / 'autism_screening_guidance.jsonl')
+RETRIEVAL_ANSWER_THRESHOLD = float(os.environ.get('AUTISM_RETRIEVAL_ANSWER_THRESHOLD', '0.85'))
+RETRIEVAL_GROUNDING_THRESHOLD = float(os.environ.get('AUTISM_RETRIEVAL_GROUNDING_THRESHOLD', '0.25'))
+RETRIEVAL_TOP_K = 3
+
+# Multi-turn sessions: per-chat KV caches so follow-ups only prefill new tokens
+MAX_SESSIONS = 64
+SESSION_IDLE_SECONDS = 30 * 60
+MAX_CONTEXT_TOKENS = 2048
+MAX_CACHED_TOKENS = 64 * 1024
 
-base = AutoModelForCausalLM.from_pretrained(
+# Nothing is loaded at import time; python app.py starts loading in the background
+manager = ModelManager(
     MODEL_NAME,
-    quantization_config=bnb_config,
-    device_map="auto"
+    ADAPTER_PATH,
+    merged_path=MERGED_MODEL_PATH,
+    local_files_only=OFFLINE,
+    backend=BACKEND,
+    adapters={name: path for name, (path, _) in ADAPTERS.items()} if ADAPTERS else None,
 )
+# Routes requests between adapters; bound to the model once it has loaded
+adapter_router = AdapterRouter(ADAPTERS, local_files_only=OFFLINE) if ADAPTERS else None
 
-# Load LoRA adapter
-print("Loading LoRA adapter...")
-model = PeftModel.from_pretrained(base, ADAPTER_PATH)
-model.eval()
-print("✓ Model loaded successfully!")
-
-# Safety guardrails
-BANNED_PHRASES = [
-    'vaccines cause autism',
-    'cure autism',
-    'diagnose my child',
-    'autism is caused by bad parenting',
-]
+scheduler = None
+sessions = None
+retrieval = None
+_runtime_lock = threading.Lock()
 
-DOMAIN_KEYWORDS = [
-    'autism', 'asd', 'child', 'toddler', 'infant', 'baby',
-    'screening', 'development', 'speech', 'behavior', 'behaviour',
-    'milestone', 'social', 'm-chat', 'sensory', 'eye contact', 'nonverbal',
-]
+
+def get_sessions() -> SessionStore:
+    """Session store, created once the tokenizer is available."""
+    global sessions
+    if sessions is None:
+        with _runtime_lock:
+            if sessions is None:
+                sessions = SessionStore(
+                    manager.get_tokenizer(),
+                    max_sessions=MAX_SESSIONS,
+                    idle_ttl_seconds=SESSION_IDLE_SECONDS,
+                    max_context_tokens=MAX_CONTEXT_TOKENS,
+                    max_cached_tokens=MAX_CACHED_TOKENS,
+                )
+    return sessions
+
+
+def get_scheduler() -> BatchScheduler:
+    """Batch scheduler, created once the model has finished loading."""
+    global scheduler
+    if scheduler is None:
+        model, tokenizer = manager.get()
+        with _runtime_lock:
+            if scheduler is None:
+                if adapter_router is not None:
+                    adapter_router.bind(model)
+                scheduler = BatchScheduler(
+                    model,
+                    tokenizer,
+                    max_batch_size=MAX_BATCH_SIZE,
+                    max_wait_ms=MAX_BATCH_WAIT_MS,
+                    max_queue_size=MAX_QUEUE_SIZE,
+                    adapters=adapter_router,
+                    do_sample=True,
+                    temperature=0.7,
+                    top_p=0.9,
+                    repetition_penalty=1.2,
+                    no_repeat_ngram_size=3,
+                    # Gemma-IT closes its turn with <end_of_turn>; stopping there keeps history clean
+                    eos_token_id=[tokenizer.eos_token_id, tokenizer.convert_tokens_to_ids('<end_of_turn>')],
+                    use_cache=True,
+                )
+    return scheduler
+
+
+def get_retrieval() -> RetrievalIndex:
+    """Retrieval index, opened (and built on first run) when first needed."""
+    global retrieval
+    if retrieval is None:
+        with _runtime_lock:
+            if retrieval is None:
+                retrieval = RetrievalIndex(
+                    RETRIEVAL_INDEX_DIR,
+                    RETRIEVAL_CORPUS_PATH,
+                    answer_threshold=RETRIEVAL_ANSWER_THRESHOLD,
+                    grounding_threshold=RETRIEVAL_GROUNDING_THRESHOLD,
+                    top_k=RETRIEVAL_TOP_K,
+                )
+    return retrieval
+
+
+answer_cache = AnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    similarity_threshold=ANSWER_CACHE_SIMILARITY,
+    path=ANSWER_CACHE_PATH,
+    # Answers persisted by other weights are dropped on load
+    model_key=manager.fingerprint(),
+)
+answer_cache.load()
+atexit.register(answer_cache.save)
+
+# Safety guardrails: blocked / out-of-domain / in-domain phrases, hot-reloaded
+GUARDRAILS_PATH = str(ROOT / 'guardrails.json')
+guardrails = GuardrailEngine.from_file(GUARDRAILS_PATH)
+
+# Live gauges reported on each /metrics scrape
+metrics.REGISTRY.register_collector(
+    'autism_answer_cache', 'Answer cache counters and size.', answer_cache.stats, 'stat')
+metrics.REGISTRY.register_collector(
+    'autism_retrieval', 'Retrieval lookups by outcome and index size.',
+    lambda: retrieval.stats() if retrieval is not None else {}, 'stat')
+metrics.REGISTRY.register_collector(
+    'autism_guardrail_rule_hits', 'Hits per guardrail rule.', guardrails.hit_counts, 'rule')
+metrics.REGISTRY.register_collector(
+    'autism_sessions', 'Session store size, cached tokens and evictions.',
+    lambda: sessions.stats() if sessions is not None else {}, 'stat')
+metrics.REGISTRY.register_collector(
+    'autism_queue_depth', 'Requests waiting for a generation batch.',
+    lambda: scheduler.queue_depth if scheduler is not None else 0)
+if adapter_router is not None:
+    metrics.REGISTRY.register_collector(
+        'autism_adapter_routed', 'Chats (or one-off requests) assigned to each adapter.',
+        lambda: {a['name']: a['routed'] for a in adapter_router.describe()}, 'adapter')
+    metrics.REGISTRY.register_collector(
+        'autism_adapter_generations', 'Generations run with each adapter.',
+        lambda: {a['name']: a['generated'] for a in adapter_router.describe()}, 'adapter')
+    metrics.REGISTRY.register_collector(
+        'autism_adapter_weight', 'Traffic weight of each adapter.',
+        lambda: {a['name']: a['weight'] for a in adapter_router.describe()}, 'adapter')
 
 DISCLAIMER = (
     '\n\n*General educational information only — '
@@ -60,54 +192,147 @@ DISCLAIMER = (
 )
 
 
+MISINFORMATION_REPLY = (
+    'I cannot provide medical diagnoses or spread misinformation. '
+    'Please consult a licensed healthcare professional or visit '
+    'cdc.gov/autism for trusted resources.'
+)
+
+OFF_TOPIC_REPLY = (
+    'I am designed to help with early autism screening and child '
+    'development guidance. Could you rephrase your question in '
+    'that context?'
+)
+
+REFUSALS = (MISINFORMATION_REPLY, OFF_TOPIC_REPLY)
+
+
+def in_conversation(session) -> bool:
+    """True once a turn of the session got past the guardrails."""
+    return any(answer not in REFUSALS for _, answer in session.turns)
+
+
+def route_adapter(session=None) -> str:
+    """Adapter for a request; a chat keeps its adapter for as long as it stays loaded."""
+    if adapter_router is None:
+        return None
+    if session is None:
+        return adapter_router.route()
+    if session.adapter not in adapter_router.names:
+        get_sessions().pin_adapter(session, adapter_router.route(session.session_id))
+    return session.adapter
+
+
+def uses_answer_cache(adapter: str) -> bool:
+    """Cached replies come from the first configured adapter; others bypass the cache."""
+    if adapter_router is None:
+        return True
+    first = next(iter(ADAPTERS))
+    return adapter == first and adapter_router.paths.get(first) == ADAPTERS[first][0]
+
+
 def generate_response(question: str, max_new_tokens: int = 512) -> str:
     """Generate response using Gemma-2B-IT chat template."""
-    prompt = (
-        f'<start_of_turn>user\n{question}<end_of_turn>\n'
-        f'<start_of_turn>model\n'
-    )
-    inputs = tokenizer(prompt, return_tensors='pt').to(model.device)
-    
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=max_new_tokens,
-            do_sample=True,
-            temperature=0.7,
-            top_p=0.9,
-            repetition_penalty=1.2,
-            no_repeat_ngram_size=3,
-            eos_token_id=tokenizer.eos_token_id,
-            pad_token_id=tokenizer.pad_token_id,
-            use_cache=True,
+    return get_scheduler().generate(build_prompt(question), max_new_tokens=max_new_tokens,
+                                    adapter=route_adapter())
+
+
+def stream_response(question: str, max_new_tokens: int = 512, session=None,
+                    trace=metrics.NULL_TRACE, context=None):
+    """Yield response text increments; a session reuses its conversation KV cache.
+
+    `context` is a list of reference passages placed ahead of the question.
+    """
+    if session is None:
+        yield from get_scheduler().stream(build_prompt(question, context), max_new_tokens=max_new_tokens,
+                                          adapter=route_adapter())
+        return
+    adapter = route_adapter(session)
+    with trace.stage('tokenize'):
+        prompt_ids = get_sessions().prepare_turn(session, question, max_new_tokens, context)
+    completed = False
+    try:
+        request = get_scheduler().submit_ids(
+            prompt_ids, max_new_tokens, past_key_values=session.past_key_values, adapter=adapter,
         )
-    
-    decoded = tokenizer.decode(outputs[0], skip_special_tokens=True)
-    parts = decoded.split('model\n')
-    if len(parts) > 1:
-        return parts[-1].strip()
-    return decoded.strip()
+        answer = ''
+        for chunk in request:
+            answer += chunk
+            yield chunk
+        trace.record_generation(request)
+        with trace.stage('postprocess'):
+            get_sessions().complete_turn(session, question, prompt_ids, request.output_ids, answer.strip())
+        completed = True
+    finally:
+        if not completed:
+            # generate() extends the cache in place, so after an error or an
+            # abandoned stream it covers tokens that session.token_ids does not
+            session.past_key_values = None
+
 
+def safe_chat(question: str, history: list = None, session_id: str = None):
+    """Apply guardrails then stream the response, yielding the reply so far."""
+    trace = metrics.start_trace()
+    history = [(user, reply.removesuffix(DISCLAIMER)) for user, reply in history or []]
+    session = get_sessions().get(session_id)
+    with session.lock:
+        get_sessions().sync(session, history)
+        try:
+            yield from _answer(question, session, trace)
+        except Exception:
+            trace.finish('error')
+            raise
 
-def safe_chat(question: str) -> str:
-    """Apply guardrails then generate response."""
-    ql = question.lower()
+
+def _answer(question: str, session, trace):
+    with trace.stage('guardrail'):
+        verdict = guardrails.classify(question)
     
-    if any(phrase in ql for phrase in BANNED_PHRASES):
-        return (
-            'I cannot provide medical diagnoses or spread misinformation. '
-            'Please consult a licensed healthcare professional or visit '
-            'cdc.gov/autism for trusted resources.' + DISCLAIMER
-        )
+    if verdict.branch == BLOCKED:
+        get_sessions().record_turn(session, question, MISINFORMATION_REPLY)
+        trace.finish(verdict.branch)
+        yield MISINFORMATION_REPLY + DISCLAIMER
+        return
     
-    if not any(kw in ql for kw in DOMAIN_KEYWORDS):
-        return (
-            'I am designed to help with early autism screening and child '
-            'development guidance. Could you rephrase your question in '
-            'that context?' + DISCLAIMER
-        )
+    # Follow-ups ("And what about at 4?") lean on earlier turns for their topic,
+    # so once a conversation is under way only the block rules apply
+    if verdict.branch != ALLOWED and not in_conversation(session):
+        get_sessions().record_turn(session, question, OFF_TOPIC_REPLY)
+        trace.finish(verdict.branch)
+        yield OFF_TOPIC_REPLY + DISCLAIMER
+        return
+    
+    # Follow-ups depend on earlier turns, so only opening questions use the
+    # curated-answer fast path and the cache
+    first_turn = not session.turns
+    with trace.stage('retrieval'):
+        retrieved = get_retrieval().lookup(question, allow_answer=first_turn)
+    if retrieved.answer is not None:
+        get_sessions().record_turn(session, question, retrieved.answer.answer)
+        trace.finish('retrieval_hit')
+        yield retrieved.answer.answer + DISCLAIMER
+        return
     
-    return generate_response(question) + DISCLAIMER
+    cacheable = first_turn and uses_answer_cache(route_adapter(session))
+    with trace.stage('cache_lookup'):
+        cached = answer_cache.get(question) if cacheable else None
+    if cached is not None:
+        get_sessions().record_turn(session, question, cached)
+        trace.finish('cache_hit')
+        yield cached + DISCLAIMER
+        return
+    
+    reply = ''
+    for chunk in stream_response(question, MAX_NEW_TOKENS, session=session, trace=trace,
+                                 context=retrieved.passages):
+        reply += chunk
+        yield reply.lstrip()
+    reply = reply.strip()
+    with trace.stage('postprocess'):
+        if reply and cacheable:
+            answer_cache.put(question, reply)
+    trace.finish('generated')
+    yield reply + DISCLAIMER
 
 
 EXAMPLE_QUESTIONS = [
@@ -119,13 +344,29 @@ EXAMPLE_QUESTIONS = [
 ]
 
 
-def respond(message: str, history: list) -> tuple:
-    """Process user message and return updated conversation history."""
+def respond(message: str, history: list, request: gr.Request = None):
+    """Process user message and stream the updated conversation history."""
     if not message.strip():
-        return '', history
-    reply = safe_chat(message)
-    history.append((message, reply))
-    return '', history
+        yield '', history
+        return
+    session_id = request.session_hash if request is not None else None
+    turns = list(history)
+    history.append((message, ''))
+    for reply in safe_chat(message, turns, session_id):
+        history[-1] = (message, reply)
+        yield '', history
+
+
+def model_status():
+    """Readiness banner; stops polling once the model is ready or has failed."""
+    return manager.status_text(), gr.Timer(active=manager.state in (IDLE, LOADING))
+
+
+def clear_conversation(request: gr.Request = None):
+    """Reset the chat and release the session's KV cache."""
+    if request is not None and sessions is not None:
+        sessions.drop(request.session_hash)
+    return [], ''
 
 
 with gr.Blocks(
@@ -141,6 +382,9 @@ with gr.Blocks(
         "Always consult a licensed healthcare provider about your child's development."
     )
     
+    status_md = gr.Markdown(manager.status_text())
+    status_timer = gr.Timer(2.0)
+    
     chatbot = gr.Chatbot(label='Conversation', height=500)
     msg_box = gr.Textbox(
         placeholder='Ask about early autism signs, milestones, screening tools...',
@@ -169,7 +413,80 @@ with gr.Blocks(
     # Wire interactions
     submit_btn.click(respond, [msg_box, chatbot], [msg_box, chatbot])
     msg_box.submit(respond, [msg_box, chatbot], [msg_box, chatbot])
-    clear_btn.click(lambda: ([], ''), None, [chatbot, msg_box])
+    clear_btn.click(clear_conversation, None, [chatbot, msg_box])
+    status_timer.tick(model_status, None, [status_md, status_timer])
+
+# Let enough callbacks run at once for the scheduler to form batches
+demo.queue(default_concurrency_limit=MAX_QUEUE_SIZE)
+
+
+
+def add_adapter_admin(server, token: str):
+    """Bearer-token endpoints to list, load, unload and re-weight adapters at runtime."""
+    import hmac
+
+    from fastapi import Body, Depends, Header, HTTPException
+
+    def authorize(authorization: str = Header(default='')):
+        if not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+            raise HTTPException(status_code=401, detail='Invalid admin token')
+
+    def apply(action, *args):
+        try:
+            action(*args)
+        except KeyError as exc:
+            raise HTTPException(status_code=404, detail=str(exc.args[0]))
+        except (ValueError, RuntimeError, OSError) as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return adapter_router.describe()
+
+    @server.get('/admin/adapters', dependencies=[Depends(authorize)])
+    def list_adapters():
+        return adapter_router.describe()
+
+    @server.post('/admin/adapters/{name}', dependencies=[Depends(authorize)])
+    def load_adapter(name: str, path: str = Body(...), weight: float = Body(0.0)):
+        # Waits for the running batch; generation resumes once the adapter is attached
+        return apply(adapter_router.load, name, path, weight)
+
+    @server.delete('/admin/adapters/{name}', dependencies=[Depends(authorize)])
+    def unload_adapter(name: str):
+        return apply(adapter_router.unload, name)
+
+    @server.put('/admin/adapters', dependencies=[Depends(authorize)])
+    def set_weights(weights: dict = Body(...)):
+        return apply(adapter_router.set_weights, weights)
+
+
+def launch_with_metrics(host: str = HOST, port: int = PORT):
+    """Serve the Gradio app with a Prometheus-text /metrics endpoint beside it.
+
+    With several adapters and AUTISM_ADMIN_TOKEN set, /admin/adapters is served too.
+    """
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import PlainTextResponse
+
+    server = FastAPI()
+
+    @server.get('/metrics')
+    def metrics_endpoint():
+        return PlainTextResponse(metrics.REGISTRY.render(), media_type='text/plain; version=0.0.4')
+
+    if adapter_router is not None and ADMIN_TOKEN:
+        add_adapter_admin(server, ADMIN_TOKEN)
+
+    server = gr.mount_gradio_app(server, demo, path='/')
+    uvicorn.run(server, host=host, port=port)
+
 
 if __name__ == "__main__":
-    demo.launch()
+    # The UI comes up immediately; the model finishes loading behind it
+    manager.start()
+    get_retrieval()
+    if metrics.ENABLED or (adapter_router is not None and ADMIN_TOKEN):
+        if metrics.REQUEST_LOG:
+            logging.basicConfig(level=logging.INFO, format='%(message)s')
+        launch_with_metrics()
+    else:
+        demo.launch(server_name=HOST, server_port=PORT)
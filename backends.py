@@ -0,0 +1,177 @@
+"""
+Inference backends for the chatbot.
+  gpu-4bit : BitsAndBytes NF4 on CUDA (the original serving path)
+  cpu-int8 : LoRA merged into fp32 weights, Linear layers dynamically
+             quantized to int8, thread pools sized for the host
+  cpu      : fp32 on CPU, the reference the int8 path is validated against
+  tiny     : randomly initialised stand-in model (tiny_lm.py) for CPU load tests
+
+Select with AUTISM_BACKEND (default: gpu-4bit when CUDA is available, else cpu-int8).
+Validate the int8 path against fp32 on a fixed prompt set:
+    python backends.py validate            # real model
+    python backends.py validate --tiny     # tiny stand-in model, no download
+"""
+
+import argparse
+import json
+import os
+
+import torch
+
+GPU_4BIT = 'gpu-4bit'
+CPU_INT8 = 'cpu-int8'
+CPU_FP32 = 'cpu'
+TINY = 'tiny'
+BACKENDS = (GPU_4BIT, CPU_INT8, CPU_FP32, TINY)
+
+# Dynamic int8 kernels take fp32 activations, and fp32 is the validation reference;
+# bf16 on CPUs without native support is slower than fp32.
+CPU_DTYPE = torch.float32
+
+VALIDATION_PROMPTS = [
+    'What are early signs of autism in a 2-year-old?',
+    'How is the M-CHAT-R screening tool used?',
+    'My child does not respond to their name at 12 months.',
+    'What developmental milestones should a toddler have by age 2?',
+    'How can I support my child with autism at home?',
+    'What is stimming?',
+    'When should I worry about my child\'s speech delay?',
+    'What are sensory sensitivities in autism?',
+]
+
+
+def select_backend(name: str = None) -> str:
+    """Resolve a backend name, falling back to AUTISM_BACKEND and then the hardware."""
+    name = name or os.environ.get('AUTISM_BACKEND', 'auto')
+    if name == 'auto':
+        return GPU_4BIT if torch.cuda.is_available() else CPU_INT8
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown backend {name!r}; expected one of {BACKENDS} or "auto"')
+    if name == GPU_4BIT and not torch.cuda.is_available():
+        raise RuntimeError('The gpu-4bit backend needs CUDA; use cpu-int8 on this host')
+    return name
+
+
+def is_cpu(backend: str) -> bool:
+    return backend in (CPU_INT8, CPU_FP32, TINY)
+
+
+def configure_cpu_threads(num_threads: int = None, interop_threads: int = None) -> dict:
+    """Size torch's intra-op pool to the usable cores and keep inter-op small.
+
+    Decoding is a sequential chain of small matmuls, so parallelism comes from
+    intra-op threads; extra inter-op threads only add contention.
+    """
+    if num_threads is None:
+        num_threads = int(os.environ.get('AUTISM_NUM_THREADS', 0)) or _usable_cores()
+    if interop_threads is None:
+        interop_threads = int(os.environ.get('AUTISM_INTEROP_THREADS', 1))
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        # Can only be set before any inter-op parallel work has started
+        pass
+    return {'num_threads': torch.get_num_threads(), 'interop_threads': torch.get_num_interop_threads()}
+
+
+def _usable_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def quantize_int8(model):
+    """Replace every nn.Linear with a dynamically quantized int8 equivalent (in place)."""
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True,
+    )
+
+
+def greedy_continuations(model, tokenizer, prompts: list, max_new_tokens: int = 32) -> list:
+    """Deterministic completions (token ids) used to compare backends."""
+    from batching import generate_batch
+    from prompts import build_prompt
+
+    prompt_ids = [tokenizer(build_prompt(p))['input_ids'] for p in prompts]
+    return [
+        generate_batch(model, tokenizer, [ids], max_new_tokens, do_sample=False)[0]
+        for ids in prompt_ids
+    ]
+
+
+def teacher_forced_agreement(model, tokenizer, prompts: list, references: list) -> float:
+    """Fraction of reference continuation positions where the model's top-1 matches."""
+    from prompts import build_prompt
+
+    matched = total = 0
+    for prompt, ref in zip(prompts, references):
+        if not ref:
+            continue
+        prompt_ids = tokenizer(build_prompt(prompt))['input_ids']
+        ids = torch.tensor([prompt_ids + ref], device=model.device)
+        with torch.inference_mode():
+            logits = model(input_ids=ids).logits[0]
+        predicted = logits[len(prompt_ids) - 1:-1].argmax(-1).tolist()
+        matched += sum(p == r for p, r in zip(predicted, ref))
+        total += len(ref)
+    return matched / total if total else 1.0
+
+
+def validate_int8(model, tokenizer, prompts: list = None, max_new_tokens: int = 32) -> dict:
+    """Compare int8 dynamic quantization against the fp32 model it is derived from.
+
+    The fp32 reference runs first; the same model is then quantized in place, so
+    peak memory stays at one copy of the weights.
+    """
+    prompts = prompts or VALIDATION_PROMPTS
+    reference = greedy_continuations(model, tokenizer, prompts, max_new_tokens)
+    quantize_int8(model)
+    candidate = greedy_continuations(model, tokenizer, prompts, max_new_tokens)
+
+    per_prompt = []
+    for prompt, ref, cand in zip(prompts, reference, candidate):
+        diverged = next((i for i, (a, b) in enumerate(zip(ref, cand)) if a != b), None)
+        if diverged is None and len(ref) != len(cand):
+            diverged = min(len(ref), len(cand))
+        per_prompt.append({
+            'prompt': prompt,
+            'exact_match': ref == cand,
+            'first_divergence': diverged,
+        })
+    return {
+        'prompts': len(prompts),
+        'exact_match_rate': sum(p['exact_match'] for p in per_prompt) / len(prompts),
+        'top1_agreement': round(teacher_forced_agreement(model, tokenizer, prompts, reference), 4),
+        'per_prompt': per_prompt,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate the CPU int8 backend against fp32.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    validate = sub.add_parser('validate')
+    validate.add_argument('--tiny', action='store_true', help='Use the tiny stand-in model')
+    validate.add_argument('--max-new-tokens', type=int, default=32)
+    validate.add_argument('--min-agreement', type=float, default=0.9,
+                          help='Fail if teacher-forced top-1 agreement is below this')
+    args = parser.parse_args()
+
+    print(f'Threads: {configure_cpu_threads()}')
+    if args.tiny:
+        from tiny_lm import build_tiny_lm
+        model, tokenizer = build_tiny_lm()
+    else:
+        from model_manager import ModelManager
+        manager = ModelManager(backend=CPU_FP32)
+        model, tokenizer = manager.get()
+
+    report = validate_int8(model, tokenizer, max_new_tokens=args.max_new_tokens)
+    print(json.dumps(report, indent=2))
+    if report['top1_agreement'] < args.min_agreement:
+        raise SystemExit(f'int8 top-1 agreement {report["top1_agreement"]} < {args.min_agreement}')
+
+
+if __name__ == '__main__':
+    main()
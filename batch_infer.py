@@ -0,0 +1,228 @@
+"""
+Offline batch inference over a JSONL of questions in the `instruction` format
+written by create_dataset.py (QA review, regression checks, regenerating
+answers after a new adapter).
+
+Prompts are read in windows and sorted by token length so each batch carries
+little padding. Results are appended as each batch finishes and carry their
+input `index`, so an interrupted run resumes where it stopped. With --workers,
+records are sharded by index across processes (one model copy each, optionally
+pinned to --devices) and merged into the output at the end.
+
+    python batch_infer.py data/autism_screening_guidance.jsonl predictions.jsonl
+    python batch_infer.py questions.jsonl out.jsonl --workers 2 --devices 0,1
+    python batch_infer.py questions.jsonl out.jsonl --backend tiny --max-new-tokens 32
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from prompts import build_prompt
+
+# Sampling settings used by the chat app; greedy decoding is the default here
+SAMPLING_KWARGS = dict(do_sample=True, temperature=0.7, top_p=0.9,
+                       repetition_penalty=1.2, no_repeat_ngram_size=3)
+
+
+def read_questions(path: str, shard: int = 0, num_shards: int = 1):
+    """Yield (index, record) for this shard's records; index counts non-blank lines."""
+    index = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if index % num_shards == shard:
+                yield index, json.loads(line)
+            index += 1
+
+
+def trim_partial_line(path: str):
+    """Drop a trailing record left half-written by a crash."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+
+def completed_indices(*paths: str) -> set:
+    done = set()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.endswith('\n'):
+                    done.add(json.loads(line)['index'])
+    return done
+
+
+def length_batches(records, tokenizer, window: int, max_batch_size: int, max_batch_tokens: int):
+    """Tokenize `window` records at a time, sort by length and cut into padded batches.
+
+    A batch closes when it reaches `max_batch_size` rows or its padded size
+    (rows x longest prompt) would exceed `max_batch_tokens`.
+    """
+    pending = []
+
+    def flush():
+        pending.sort(key=lambda item: len(item[2]))
+        batch = []
+        for item in pending:
+            width = len(item[2])     # sorted ascending, so this row is the longest
+            if batch and (len(batch) >= max_batch_size or (len(batch) + 1) * width > max_batch_tokens):
+                yield batch
+                batch = []
+            batch.append(item)
+        if batch:
+            yield batch
+        pending.clear()
+
+    for index, record in records:
+        question = (record.get('instruction') or '').strip()
+        if not question:
+            continue
+        pending.append((index, record, tokenizer(build_prompt(question))['input_ids']))
+        if len(pending) >= window:
+            yield from flush()
+    yield from flush()
+
+
+def run_shard(config: dict, shard: int = 0, num_shards: int = 1, device: str = None) -> dict:
+    """Generate every unfinished record of one shard; returns its throughput counters."""
+    if device is not None and device != 'cpu':
+        # Must be set before CUDA is initialised in this process
+        os.environ['CUDA_VISIBLE_DEVICES'] = device
+    from batching import generate_batch
+    from model_manager import ModelManager
+
+    output = config['output'] if num_shards == 1 else shard_path(config['output'], shard, num_shards)
+    trim_partial_line(output)
+    done = completed_indices(output, config['output']) if num_shards > 1 else completed_indices(output)
+    records = ((i, r) for i, r in read_questions(config['input'], shard, num_shards) if i not in done)
+
+    manager = ModelManager(config['model'], config['adapter'], config['merged'],
+                           local_files_only=config['offline'], backend=config['backend'])
+    model, tokenizer = manager.get()
+    generation_kwargs = dict(SAMPLING_KWARGS) if config['sample'] else {'do_sample': False}
+    generation_kwargs['eos_token_id'] = [tokenizer.eos_token_id,
+                                         tokenizer.convert_tokens_to_ids('<end_of_turn>')]
+
+    skipped = sum(1 for i in done if i % num_shards == shard)
+    stats = {'records': 0, 'skipped': skipped, 'prompt_tokens': 0, 'padded_prompt_tokens': 0,
+             'completion_tokens': 0, 'seconds': 0.0}
+    start = time.perf_counter()
+    with open(output, 'a', encoding='utf-8') as out:
+        for batch in length_batches(records, tokenizer, config['window'],
+                                    config['batch_size'], config['max_batch_tokens']):
+            prompt_ids = [ids for _, _, ids in batch]
+            completions = generate_batch(model, tokenizer, prompt_ids, config['max_new_tokens'],
+                                         **generation_kwargs)
+            for (index, record, ids), completion in zip(batch, completions):
+                result = {
+                    'index': index,
+                    'instruction': record['instruction'],
+                    'output': tokenizer.decode(completion, skip_special_tokens=True).strip(),
+                    'prompt_tokens': len(ids),
+                    'completion_tokens': len(completion),
+                }
+                if record.get('output'):
+                    result['reference'] = record['output']
+                out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                stats['prompt_tokens'] += len(ids)
+                stats['completion_tokens'] += len(completion)
+            out.flush()
+            stats['records'] += len(batch)
+            stats['padded_prompt_tokens'] += len(batch) * max(len(ids) for ids in prompt_ids)
+    stats['seconds'] = time.perf_counter() - start
+    stats['load_seconds'] = manager.timings.get('total', 0.0)
+    return stats
+
+
+def shard_path(output: str, shard: int, num_shards: int) -> str:
+    return f'{output}.shard-{shard}-of-{num_shards}'
+
+
+def merge_shards(output: str, num_shards: int):
+    """Append finished shard files to the output and remove them."""
+    with open(output, 'a', encoding='utf-8') as out:
+        for shard in range(num_shards):
+            path = shard_path(output, shard, num_shards)
+            if not os.path.exists(path):
+                continue
+            trim_partial_line(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    out.write(line)
+            os.remove(path)
+
+
+def summarize(shard_stats: list, wall: float) -> dict:
+    total = {key: sum(s[key] for s in shard_stats)
+             for key in ('records', 'skipped', 'prompt_tokens', 'padded_prompt_tokens', 'completion_tokens')}
+    total['workers'] = len(shard_stats)
+    total['wall_s'] = round(wall, 3)
+    total['load_s'] = round(max(s['load_seconds'] for s in shard_stats), 3)
+    generate_s = max(s['seconds'] for s in shard_stats)
+    total['generate_s'] = round(generate_s, 3)
+    total['records_per_sec'] = round(total['records'] / generate_s, 3) if generate_s else None
+    total['completion_tokens_per_sec'] = round(total['completion_tokens'] / generate_s, 3) if generate_s else None
+    # Fraction of prompt positions holding real tokens rather than padding
+    total['padding_efficiency'] = (round(total['prompt_tokens'] / total['padded_prompt_tokens'], 4)
+                                   if total['padded_prompt_tokens'] else None)
+    return total
+
+
+def main():
+    from model_manager import MERGED_MODEL_DIR, MODEL_NAME
+
+    parser = argparse.ArgumentParser(description='Batch inference over a JSONL of questions.')
+    parser.add_argument('input', help='JSONL with an `instruction` field per line')
+    parser.add_argument('output', help='Predictions JSONL (appended to; reruns resume)')
+    parser.add_argument('--backend', default=None, help='gpu-4bit, cpu-int8, cpu, tiny or auto')
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--adapter', default=None, help='Adapter dir or Hub id (default: local if present)')
+    parser.add_argument('--merged', default=MERGED_MODEL_DIR)
+    parser.add_argument('--offline', action='store_true', help='Only use locally cached files')
+    parser.add_argument('--max-new-tokens', type=int, default=512)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--max-batch-tokens', type=int, default=8192,
+                        help='Cap on rows x padded prompt length per batch')
+    parser.add_argument('--window', type=int, default=1024,
+                        help='Records read and length-sorted at a time')
+    parser.add_argument('--sample', action='store_true', help="Use the chat app's sampling settings")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--devices', default=None,
+                        help='Comma-separated CUDA device ids (or cpu), assigned to workers round-robin')
+    args = parser.parse_args()
+
+    config = {k: v for k, v in vars(args).items() if k not in ('workers', 'devices')}
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    trim_partial_line(args.output)
+    devices = args.devices.split(',') if args.devices else [None]
+
+    start = time.perf_counter()
+    if args.workers == 1:
+        shard_stats = [run_shard(config, device=devices[0])]
+    else:
+        if 'AUTISM_NUM_THREADS' not in os.environ:
+            # CPU workers split the cores instead of each claiming all of them
+            os.environ['AUTISM_NUM_THREADS'] = str(max(1, (os.cpu_count() or 1) // args.workers))
+        with ProcessPoolExecutor(args.workers, mp_context=get_context('spawn')) as pool:
+            futures = [pool.submit(run_shard, config, shard, args.workers, devices[shard % len(devices)])
+                       for shard in range(args.workers)]
+            shard_stats = [future.result() for future in futures]
+        merge_shards(args.output, args.workers)
+
+    print(json.dumps(summarize(shard_stats, time.perf_counter() - start), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Dynamic request batching for the chatbot's generation path.
+Requests arriving within a short window are left-padded into one batch,
+generated together with a single model.generate call, and each caller
+receives only its own completion. With several LoRA adapters on one base
+model, each batch holds requests for a single adapter.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import torch
+from transformers.generation.streamers import BaseStreamer
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the scheduler's pending queue is at capacity."""
+
+
+def _eos_ids(tokenizer, generation_kwargs: dict) -> set:
+    eos_ids = generation_kwargs.get('eos_token_id', tokenizer.eos_token_id)
+    return set(eos_ids if isinstance(eos_ids, (list, tuple)) else [eos_ids])
+
+
+def generate_batch(model, tokenizer, prompt_ids: list, max_new_tokens: int,
+                   streamer=None, past_key_values=None, **generation_kwargs) -> list:
+    """Left-pad tokenized prompts, generate once, return new token ids per row.
+
+    `past_key_values` may only be given for a single prompt whose prefix it covers;
+    generation then prefills just the uncached suffix and extends the cache in place.
+    """
+    pad_id = tokenizer.pad_token_id
+    width = max(len(ids) for ids in prompt_ids)
+    input_ids = torch.full((len(prompt_ids), width), pad_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(prompt_ids), width), dtype=torch.long)
+    for row, ids in enumerate(prompt_ids):
+        input_ids[row, width - len(ids):] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, width - len(ids):] = 1
+
+    with torch.inference_mode():
+        outputs = model.generate(
+            input_ids=input_ids.to(model.device),
+            attention_mask=attention_mask.to(model.device),
+            max_new_tokens=max_new_tokens,
+            pad_token_id=pad_id,
+            streamer=streamer,
+            past_key_values=past_key_values,
+            **generation_kwargs,
+        )
+
+    # Only the generated suffix is returned; the echoed prompt is never decoded
+    eos_ids = _eos_ids(tokenizer, generation_kwargs)
+    completions = []
+    for row in outputs[:, width:].tolist():
+        for i, token in enumerate(row):
+            if token in eos_ids:
+                row = row[:i]
+                break
+        completions.append(row)
+    return completions
+
+
+class GenerationRequest:
+    """A single queued prompt; completed by the scheduler's worker thread.
+
+    Iterating the request yields text increments as tokens are generated.
+    """
+
+    def __init__(self, prompt_ids: list, max_new_tokens: int, past_key_values=None, adapter: str = None):
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.past_key_values = past_key_values
+        self.adapter = adapter
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.batch_size = None
+        self.output_ids = None
+        self.text = None
+        self.error = None
+        self._chunks = queue.Queue()
+        self._done = threading.Event()
+
+    def _finish(self, output_ids=None, text=None, error=None):
+        self.finished_at = time.perf_counter()
+        self.output_ids = output_ids
+        self.text = text
+        self.error = error
+        self._done.set()
+        self._chunks.put(None)
+
+    def __iter__(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+    def result(self, timeout: float = None) -> str:
+        """Block until the completion is ready and return its text."""
+        if not self._done.wait(timeout):
+            raise TimeoutError('Generation did not finish in time')
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+
+class _BatchStreamer(BaseStreamer):
+    """Fans per-step batch tokens out to each request as decoded text."""
+
+    def __init__(self, tokenizer, requests: list, eos_ids: set):
+        self.tokenizer = tokenizer
+        self.requests = requests
+        self.eos_ids = eos_ids
+        self.prompt_seen = False
+        self.finished = [False] * len(requests)
+        self.token_cache = [[] for _ in requests]
+        self.print_len = [0] * len(requests)
+
+    def put(self, value):
+        # The first call carries the (padded) prompts, which are never echoed
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+        if self.requests[0].first_token_at is None:
+            now = time.perf_counter()
+            for request in self.requests:
+                request.first_token_at = now
+        for row, token in enumerate(value.view(-1).tolist()):
+            if self.finished[row]:
+                continue
+            if token in self.eos_ids:
+                self.finished[row] = True
+                self._flush(row)
+                continue
+            self.token_cache[row].append(token)
+            text = self.tokenizer.decode(self.token_cache[row], skip_special_tokens=True)
+            if text.endswith('\n'):
+                self._emit(row, text[self.print_len[row]:])
+                self.token_cache[row] = []
+                self.print_len[row] = 0
+            elif not text.endswith('\ufffd'):
+                # Hold back incomplete multi-byte characters until they resolve
+                self._emit(row, text[self.print_len[row]:])
+                self.print_len[row] = len(text)
+
+    def end(self):
+        for row in range(len(self.requests)):
+            if not self.finished[row]:
+                self.finished[row] = True
+                self._flush(row)
+
+    def _flush(self, row: int):
+        text = self.tokenizer.decode(self.token_cache[row], skip_special_tokens=True)
+        self._emit(row, text[self.print_len[row]:])
+        self.token_cache[row] = []
+        self.print_len[row] = 0
+
+    def _emit(self, row: int, chunk: str):
+        if chunk:
+            self.requests[row]._chunks.put(chunk)
+
+
+class BatchScheduler:
+    """Collects concurrent requests into batches for one shared model.
+
+    `adapters` (an adapters.AdapterRouter) switches the model to each batch's
+    adapter and holds its lock for the duration of the generate call.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8,
+                 max_wait_ms: float = 20.0, max_queue_size: int = 64,
+                 adapters=None, **generation_kwargs):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.adapters = adapters
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.generation_kwargs = generation_kwargs
+
+        # Batched generation with a decoder-only model needs left padding
+        self.tokenizer.padding_side = 'left'
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt: str, max_new_tokens: int = 512, adapter: str = None) -> GenerationRequest:
+        """Queue a prompt and return its request handle without blocking."""
+        prompt_ids = self.tokenizer(prompt, add_special_tokens=True)['input_ids']
+        return self.submit_ids(prompt_ids, max_new_tokens, adapter=adapter)
+
+    def submit_ids(self, prompt_ids: list, max_new_tokens: int = 512,
+                   past_key_values=None, adapter: str = None) -> GenerationRequest:
+        """Queue already tokenized prompt ids, optionally with a KV cache for their prefix.
+
+        Requests carrying a cache are generated on their own rather than batched.
+        """
+        request = GenerationRequest(prompt_ids, max_new_tokens, past_key_values, adapter)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Scheduler is closed')
+            if len(self._pending) >= self.max_queue_size:
+                raise QueueFullError(f'Generation queue is full ({self.max_queue_size} pending)')
+            self._pending.append(request)
+            self._cond.notify()
+        return request
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def generate(self, prompt: str, max_new_tokens: int = 512, timeout: float = None,
+                 adapter: str = None) -> str:
+        """Queue a prompt and block until its completion is ready."""
+        return self.submit(prompt, max_new_tokens, adapter).result(timeout)
+
+    def stream(self, prompt: str, max_new_tokens: int = 512, adapter: str = None):
+        """Queue a prompt and yield its text increments as they are generated."""
+        yield from self.submit(prompt, max_new_tokens, adapter)
+
+    def close(self):
+        """Stop the worker after the current batch; pending requests fail."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+        while self._pending:
+            self._pending.popleft()._finish(error=RuntimeError('Scheduler is closed'))
+
+    def _next_batch(self) -> list:
+        """Wait for a request, then gather compatible ones until full or timed out."""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return []
+            first = self._pending.popleft()
+            batch = [first]
+            if first.past_key_values is not None:
+                return batch
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                # Only requests with the same generation length and adapter share a batch
+                match = next((r for r in self._pending
+                              if r.max_new_tokens == first.max_new_tokens
+                              and r.adapter == first.adapter
+                              and r.past_key_values is None), None)
+                if match is not None:
+                    self._pending.remove(match)
+                    batch.append(match)
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            started = time.perf_counter()
+            for request in batch:
+                request.started_at = started
+                request.batch_size = len(batch)
+            streamer = _BatchStreamer(
+                self.tokenizer, batch, _eos_ids(self.tokenizer, self.generation_kwargs),
+            )
+            adapter = (self.adapters.use(batch[0].adapter, len(batch))
+                       if self.adapters is not None else nullcontext())
+            try:
+                with adapter:
+                    completions = generate_batch(
+                        self.model, self.tokenizer,
+                        [r.prompt_ids for r in batch],
+                        batch[0].max_new_tokens,
+                        streamer=streamer,
+                        past_key_values=batch[0].past_key_values,
+                        **self.generation_kwargs,
+                    )
+            except Exception as exc:  # surface model errors to every waiting caller
+                for request in batch:
+                    request._finish(error=exc)
+                continue
+            for request, ids in zip(batch, completions):
+                text = self.tokenizer.decode(ids, skip_special_tokens=True).strip()
+                request._finish(output_ids=ids, text=text)
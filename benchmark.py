@@ -0,0 +1,269 @@
+"""
+Load-testing and latency benchmark for the chat serving path (safe_chat).
+Replays prompts at a fixed concurrency or open-loop arrival rate and reports
+time-to-first-token, tokens/sec, end-to-end percentiles, guardrail-path
+latency and peak memory as JSON, optionally compared against a baseline.
+
+    python benchmark.py --backend tiny --prompts examples --concurrency 8
+    python benchmark.py --backend tiny --prompts data/autism_screening_guidance.jsonl \\
+        --rate 20 --requests 200 --output bench.json --baseline bench_baseline.json
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+DATASET_PATH = str(ROOT / 'data' / 'autism_screening_guidance.jsonl')
+PROMPT_KEYS = ('instruction', 'question', 'prompt', 'message', 'title')
+
+GUARDRAIL_PROMPTS = [
+    'vaccines cause autism',
+    'Can you diagnose my child?',
+    'What is the capital of France?',
+    'Write me a poem about love.',
+    'What stocks should I invest in?',
+]
+
+# (metric, direction) pairs compared against a baseline; +1 means higher is worse
+COMPARED_METRICS = [
+    ('ttft_ms.p50', 1), ('ttft_ms.p95', 1),
+    ('e2e_ms.p50', 1), ('e2e_ms.p95', 1), ('e2e_ms.p99', 1),
+    ('guardrail_us.p50', 1), ('guardrail_us.p99', 1),
+    ('tokens_per_sec', -1), ('requests_per_sec', -1),
+    ('peak_rss_mb', 1), ('peak_vram_mb', 1),
+]
+
+
+def load_prompts(source: str, example_questions: list) -> list:
+    """Prompts from 'examples', the guidance dataset ('dataset') or any JSONL file."""
+    if source == 'examples':
+        return list(example_questions)
+    path = DATASET_PATH if source == 'dataset' else source
+    prompts = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            text = next((record[k] for k in PROMPT_KEYS if record.get(k)), None)
+            if text:
+                prompts.append(text)
+    if not prompts:
+        raise ValueError(f'No prompts found in {path} (looked for {PROMPT_KEYS})')
+    return prompts
+
+
+def percentiles(values: list, scale: float = 1.0) -> dict:
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None}
+    values = sorted(v * scale for v in values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99),
+            'mean': round(statistics.fmean(values), 3)}
+
+
+def peak_memory() -> dict:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+    vram_mb = 0.0
+    try:
+        import torch
+        if torch.cuda.is_available():
+            vram_mb = torch.cuda.max_memory_allocated() / (1024 * 1024)
+    except ImportError:
+        pass
+    return {'peak_rss_mb': round(rss_mb, 1), 'peak_vram_mb': round(vram_mb, 1)}
+
+
+def run_one(app, question: str) -> dict:
+    """Drive safe_chat for one question and time its stream."""
+    start = time.perf_counter()
+    first = None
+    reply = ''
+    updates = 0
+    for reply in app.safe_chat(question):
+        updates += 1
+        if first is None:
+            first = time.perf_counter()
+    end = time.perf_counter()
+    answer = reply.removesuffix(app.DISCLAIMER)
+    tokens = len(app.manager.tokenizer(answer, add_special_tokens=False)['input_ids'])
+    # Guardrail refusals and cache hits arrive as a single update
+    return {'start': start, 'ttft': first - start, 'e2e': end - start,
+            'decode': end - first, 'tokens': tokens, 'generated': updates > 1}
+
+
+def run_load(app, prompts: list, requests: int, concurrency: int, rate: float, seed: int) -> list:
+    """Closed loop at `concurrency`, or open loop with Poisson arrivals at `rate` req/s."""
+    rng = random.Random(seed)
+    questions = [prompts[i % len(prompts)] for i in range(requests)]
+    results = []
+    lock = threading.Lock()
+
+    def task(question):
+        try:
+            result = run_one(app, question)
+        except Exception as exc:  # count failures rather than aborting the run
+            result = {'error': repr(exc)}
+        with lock:
+            results.append(result)
+
+    workers = concurrency if rate is None else max(concurrency, 64)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for question in questions:
+            if rate is not None:
+                time.sleep(rng.expovariate(rate))
+            pool.submit(task, question)
+    return results
+
+
+def guardrail_latency(app, iterations: int) -> list:
+    samples = []
+    for i in range(iterations):
+        question = GUARDRAIL_PROMPTS[i % len(GUARDRAIL_PROMPTS)]
+        start = time.perf_counter()
+        for _ in app.safe_chat(question):
+            pass
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(results: list, wall: float, guardrail: list) -> dict:
+    ok = [r for r in results if 'error' not in r]
+    generated = [r for r in ok if r['generated']]
+    total_tokens = sum(r['tokens'] for r in generated)
+    decode_rates = [r['tokens'] / r['decode'] for r in generated if r['decode'] > 0]
+    summary = {
+        'requests': len(results),
+        'errors': len(results) - len(ok),
+        'generated': len(generated),
+        'wall_s': round(wall, 3),
+        'requests_per_sec': round(len(ok) / wall, 3) if wall else None,
+        'tokens_per_sec': round(total_tokens / wall, 3) if wall else None,
+        'per_request_tokens_per_sec': percentiles(decode_rates),
+        'ttft_ms': percentiles([r['ttft'] for r in generated], 1000),
+        'e2e_ms': percentiles([r['e2e'] for r in generated], 1000),
+        'guardrail_us': percentiles(guardrail, 1e6),
+    }
+    summary.update(peak_memory())
+    return summary
+
+
+def _lookup(summary: dict, dotted: str):
+    value = summary
+    for part in dotted.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> list:
+    """Metrics that regressed by more than `tolerance` (fractional) versus the baseline.
+
+    A metric the baseline measured but this run could not (e.g. no request
+    generated) counts as a regression, and so does throughput falling to zero.
+    """
+    regressions = []
+    for metric, direction in COMPARED_METRICS:
+        new, old = _lookup(summary, metric), _lookup(baseline, metric)
+        if old is None:
+            continue
+        if new is None:
+            regressions.append({'metric': metric, 'baseline': old, 'current': None, 'change': None})
+            continue
+        if old == 0:
+            # No relative change from zero (e.g. VRAM on a CPU baseline)
+            continue
+        change = (new - old) / old * direction
+        if change > tolerance:
+            regressions.append({'metric': metric, 'baseline': old, 'current': new,
+                                'change': round(change, 4)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the chat serving path.')
+    parser.add_argument('--backend', default='tiny', help='tiny, cpu-int8, cpu, gpu-4bit or auto')
+    parser.add_argument('--prompts', default='examples',
+                        help="'examples', 'dataset' or a JSONL path (e.g. requests.jsonl)")
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=None, help='Open-loop arrivals per second')
+    parser.add_argument('--max-new-tokens', type=int, default=64)
+    parser.add_argument('--guardrail-iterations', type=int, default=1000)
+    parser.add_argument('--use-answer-cache', action='store_true',
+                        help='Leave the answer cache on (off by default so every request generates)')
+    parser.add_argument('--use-retrieval-answers', action='store_true',
+                        help='Leave the curated-answer fast path on (off by default; grounding stays on)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Write results JSON here')
+    parser.add_argument('--baseline', default=None, help='Compare against this results JSON')
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    args = parser.parse_args()
+
+    # The backend is read when app is imported
+    os.environ['AUTISM_BACKEND'] = args.backend
+    import app
+
+    app.MAX_NEW_TOKENS = args.max_new_tokens
+    app.answer_cache.path = None              # never overwrite the real cache file
+    app.answer_cache.clear()
+    if not args.use_answer_cache:
+        app.answer_cache.max_entries = 0
+    if not args.use_retrieval_answers:
+        # Similarity never exceeds 1, so no question takes the curated-answer path
+        app.get_retrieval().answer_threshold = float('inf')
+
+    t0 = time.perf_counter()
+    app.manager.load()
+    load_s = time.perf_counter() - t0
+    prompts = load_prompts(args.prompts, app.EXAMPLE_QUESTIONS)
+
+    # Warm up kernels and the scheduler before timing
+    run_one(app, prompts[0])
+
+    start = time.perf_counter()
+    results = run_load(app, prompts, args.requests, args.concurrency, args.rate, args.seed)
+    wall = time.perf_counter() - start
+    guardrail = guardrail_latency(app, args.guardrail_iterations)
+
+    summary = summarize(results, wall, guardrail)
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+        'load_timings_s': dict(app.manager.timings, wall=round(load_s, 3)),
+        'results': summary,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline.get('results', baseline), args.tolerance)
+        report['regressions'] = regressions
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if regressions:
+        raise SystemExit(f'{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}')
+
+
+if __name__ == '__main__':
+    main()
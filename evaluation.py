@@ -0,0 +1,447 @@
+"""
+Batched, cached evaluation for the fine-tuned adapters (replaces the
+notebook's one-text-at-a-time perplexity and metric loops).
+  perplexity   padded, attention-masked forward passes over length-sorted batches
+  predictions  batched generation via batching.generate_batch, cached in sqlite
+               by (model + adapter checksum, prompt, generation config) so reruns
+               only generate what changed
+  metrics      ROUGE-1 / ROUGE-L and corpus BLEU, scored in chunks across processes
+
+Compare checkpoints on the eval split written by create_dataset.py; one base
+model is loaded and each adapter is attached to it:
+    python evaluation.py compare autism_guidance_gemma_2b/checkpoint-51 autism_guidance_gemma_2b/checkpoint-102
+    python evaluation.py compare base autism_guidance_gemma_2b --limit 50 --greedy
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+
+import torch
+import torch.nn.functional as F
+
+from batch_infer import SAMPLING_KWARGS, length_batches
+from prompts import build_prompt
+
+CACHE_PATH = 'cache/eval_predictions.sqlite'
+SPLITS_DIR = 'data/splits'
+BASE = 'base'
+
+# Mirrors the notebook's generate_response
+GENERATION_CONFIG = dict(max_new_tokens=512, **SAMPLING_KWARGS)
+GREEDY_CONFIG = dict(max_new_tokens=512, do_sample=False)
+
+METRIC_CHUNK_SIZE = 64
+BLEU_MAX_ORDER = 4
+
+
+def format_text(instruction: str, output: str) -> str:
+    """Full training text for one example (same layout as the notebook's format_example)."""
+    return f'{build_prompt(instruction.strip())}{output.strip()}<end_of_turn>'
+
+
+def load_eval_examples(splits_dir: str = SPLITS_DIR, split: str = 'eval', limit: int = None) -> list:
+    """Examples from one split of the sharded dataset, in shard order."""
+    with open(Path(splits_dir) / 'manifest.json', 'r', encoding='utf-8') as f:
+        shards = json.load(f)['splits'][split]['shards']
+    examples = []
+    for path in shards:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    examples.append(json.loads(line))
+                if limit is not None and len(examples) >= limit:
+                    return examples
+    return examples
+
+
+# ---------------------------------------------------------------- perplexity
+
+def _row_losses(mdl, rows: list, pad_id: int, batch_size: int) -> list:
+    """Mean next-token loss of each (input_ids, labels) row; None when nothing is scored.
+
+    Rows are sorted by length so each batch pads little; padded positions are
+    masked out of both attention and the loss, as are labels of -100.
+    """
+    mdl.eval()
+    order = sorted(range(len(rows)), key=lambda i: len(rows[i][0]))
+    losses = [None] * len(rows)
+    for first in range(0, len(order), batch_size):
+        indices = order[first:first + batch_size]
+        width = max(len(rows[i][0]) for i in indices)
+        input_ids = torch.full((len(indices), width), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(indices), width), dtype=torch.long)
+        for row, i in enumerate(indices):
+            ids = rows[i][0]
+            input_ids[row, :len(ids)] = torch.as_tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+        input_ids = input_ids.to(mdl.device)
+        attention_mask = attention_mask.to(mdl.device)
+        with torch.inference_mode():
+            logits = mdl(input_ids=input_ids, attention_mask=attention_mask).logits
+            for row, i in enumerate(indices):
+                # One row at a time keeps the fp32 copy of the vocab-wide logits small
+                labels = torch.as_tensor(rows[i][1], dtype=torch.long, device=logits.device)
+                n = len(labels) - 1
+                if n <= 0 or not (labels[1:] != -100).any():
+                    continue
+                losses[i] = F.cross_entropy(logits[row, :n].float(), labels[1:], ignore_index=-100).item()
+    return losses
+
+
+def compute_perplexity(mdl, tok, texts: list, max_len: int = 256, batch_size: int = 4) -> float:
+    """Perplexity from the mean per-text loss (lower = better), scored in padded batches."""
+    encoded = [tok(text, truncation=True, max_length=max_len)['input_ids'] for text in texts]
+    losses = _row_losses(mdl, [(ids, ids) for ids in encoded], tok.pad_token_id, batch_size)
+    return round(math.exp(sum(loss or 0.0 for loss in losses) / len(texts)), 4)
+
+
+def compute_packed_perplexity(mdl, packed, limit: int = None, batch_size: int = 4) -> float:
+    """Perplexity on the response tokens of a PackedDataset split, without re-tokenizing.
+
+    Each packed example is scored on its own, so examples sharing a packed
+    sequence cannot see each other; weighted copies count once per copy.
+    """
+    count = packed.num_examples if limit is None else min(limit, packed.num_examples)
+    rows = [(item['input_ids'], item['labels']) for item in map(packed.example, range(count))]
+    pad_id = packed.meta['settings']['pad_token_id']
+    losses = [loss for loss in _row_losses(mdl, rows, 0 if pad_id is None else pad_id, batch_size)
+              if loss is not None]
+    return round(math.exp(sum(losses) / len(losses)), 4)
+
+
+# ---------------------------------------------------------- prediction cache
+
+def adapter_checksum(path: str) -> str:
+    """Content hash of a local adapter's config and weights; Hub ids and the base use their name."""
+    from model_manager import ADAPTER_WEIGHT_FILES
+
+    if path in (None, BASE):
+        return BASE
+    directory = Path(path)
+    if not directory.is_dir():
+        return f'hub:{path}'
+    digest = hashlib.sha256()
+    for name in ('adapter_config.json',) + ADAPTER_WEIGHT_FILES:
+        file = directory / name
+        if file.exists():
+            digest.update(name.encode('utf-8'))
+            with open(file, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """sqlite store of generated answers keyed by (model key, prompt, generation config)."""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS predictions ('
+            ' key TEXT PRIMARY KEY, model_key TEXT, prompt TEXT, config TEXT,'
+            ' output TEXT, created_at REAL)'
+        )
+
+    @staticmethod
+    def key(model_key: str, prompt: str, config: dict) -> str:
+        payload = json.dumps([model_key, prompt, config], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        for first in range(0, len(keys), 500):
+            chunk = keys[first:first + 500]
+            marks = ','.join('?' * len(chunk))
+            found.update(self._db.execute(
+                f'SELECT key, output FROM predictions WHERE key IN ({marks})', chunk))
+        return found
+
+    def put_many(self, rows: list):
+        """Store (key, model_key, prompt, config, output) rows."""
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?)',
+                [(key, model_key, prompt, json.dumps(config, sort_keys=True), output, now)
+                 for key, model_key, prompt, config, output in rows],
+            )
+
+    def close(self):
+        self._db.close()
+
+
+def generate_predictions(mdl, tok, prompts: list, generation_config: dict = None,
+                         batch_size: int = 8, cache: PredictionCache = None,
+                         model_key: str = BASE, max_batch_tokens: int = 8192, stats: dict = None) -> list:
+    """Answers for `prompts` (questions), generated in length-sorted batches.
+
+    With a cache, only prompts missing for this model key and config are
+    generated, and each finished batch is stored before the next starts.
+    `stats`, if given, receives the generated and cached counts.
+    """
+    from batching import generate_batch
+
+    config = dict(generation_config or GENERATION_CONFIG)
+    keys = [PredictionCache.key(model_key, p, config) for p in prompts]
+    found = cache.get_many(list(set(keys))) if cache is not None else {}
+    missing = {}
+    for i, key in enumerate(keys):
+        if key not in found:
+            missing.setdefault(key, i)
+
+    kwargs = {k: v for k, v in config.items() if k != 'max_new_tokens'}
+    kwargs['eos_token_id'] = [tok.eos_token_id, tok.convert_tokens_to_ids('<end_of_turn>')]
+    records = ((i, {'instruction': prompts[i]}) for i in missing.values())
+    for batch in length_batches(records, tok, window=1024, max_batch_size=batch_size,
+                                max_batch_tokens=max_batch_tokens):
+        completions = generate_batch(mdl, tok, [ids for _, _, ids in batch],
+                                     config['max_new_tokens'], **kwargs)
+        rows = []
+        for (i, _, _), completion in zip(batch, completions):
+            output = tok.decode(completion, skip_special_tokens=True).strip()
+            found[keys[i]] = output
+            rows.append((keys[i], model_key, prompts[i], config, output))
+        if cache is not None:
+            cache.put_many(rows)
+    if stats is not None:
+        stats.update(generated=len(missing), cached=len(prompts) - len(missing))
+    return [found[key] for key in keys]
+
+
+# ------------------------------------------------------------------- metrics
+
+def tokenize_13a(line: str) -> list:
+    """The standard mteval-v13a BLEU tokenization (as used by sacrebleu and `evaluate`)."""
+    line = line.replace('<skipped>', '').replace('-\n', '').replace('\n', ' ')
+    if '&' in line:
+        line = line.replace('&quot;', '"').replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
+    line = f' {line} '
+    line = re.sub(r'([\{-\~\[-\` -\&\(-\+\:-\@\/])', r' \1 ', line)
+    line = re.sub(r'([^0-9])([\.,])', r'\1 \2 ', line)
+    line = re.sub(r'([\.,])([^0-9])', r' \1 \2', line)
+    line = re.sub(r'([0-9])(-)', r'\1 \2 ', line)
+    return line.split()
+
+
+def _ngrams(tokens: list, n: int) -> Counter:
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def _score_chunk(pairs: list) -> dict:
+    """ROUGE sums and BLEU sufficient statistics for (prediction, reference) pairs."""
+    from rouge_score import rouge_scorer
+
+    scorer = rouge_scorer.RougeScorer(['rouge1', 'rougeL'], use_stemmer=True)
+    stats = {'rouge1': 0.0, 'rougeL': 0.0, 'count': len(pairs), 'hyp_len': 0, 'ref_len': 0,
+             'matches': [0] * BLEU_MAX_ORDER, 'possible': [0] * BLEU_MAX_ORDER}
+    for prediction, reference in pairs:
+        scores = scorer.score(reference, prediction)
+        stats['rouge1'] += scores['rouge1'].fmeasure
+        stats['rougeL'] += scores['rougeL'].fmeasure
+
+        hyp, ref = tokenize_13a(prediction), tokenize_13a(reference)
+        stats['hyp_len'] += len(hyp)
+        stats['ref_len'] += len(ref)
+        for n in range(1, BLEU_MAX_ORDER + 1):
+            hyp_ngrams = _ngrams(hyp, n)
+            stats['matches'][n - 1] += sum((hyp_ngrams & _ngrams(ref, n)).values())
+            stats['possible'][n - 1] += max(0, len(hyp) - n + 1)
+    return stats
+
+
+def _bleu(matches: list, possible: list, hyp_len: int, ref_len: int) -> float:
+    """Corpus BLEU without smoothing, from summed n-gram statistics."""
+    if min(matches) == 0 or hyp_len == 0:
+        return 0.0
+    log_precision = sum(math.log(m / p) for m, p in zip(matches, possible)) / len(matches)
+    ratio = hyp_len / ref_len
+    brevity_penalty = 1.0 if ratio > 1.0 else math.exp(1 - 1 / ratio)
+    return brevity_penalty * math.exp(log_precision)
+
+
+def compute_metrics(predictions: list, references: list, workers: int = None,
+                    chunk_size: int = METRIC_CHUNK_SIZE) -> dict:
+    """ROUGE-1, ROUGE-L (mean F1) and corpus BLEU; chunks are scored in parallel processes."""
+    pairs = list(zip(predictions, references))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        results = [_score_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_score_chunk, chunks))
+
+    count = sum(r['count'] for r in results) or 1
+    matches = [sum(r['matches'][n] for r in results) for n in range(BLEU_MAX_ORDER)]
+    possible = [sum(r['possible'][n] for r in results) for n in range(BLEU_MAX_ORDER)]
+    bleu = _bleu(matches, possible, sum(r['hyp_len'] for r in results), sum(r['ref_len'] for r in results))
+    return {
+        'rouge1': round(sum(r['rouge1'] for r in results) / count, 4),
+        'rougeL': round(sum(r['rougeL'] for r in results) / count, 4),
+        'bleu': round(bleu, 4),
+    }
+
+
+# ------------------------------------------------------------ checkpoints
+
+def _adapter_name(path: str, taken: set) -> str:
+    # PEFT adapter names become module keys, which cannot contain dots
+    name = re.sub(r'\W', '_', Path(path).name) or 'adapter'
+    while name in taken:
+        name += '_'
+    return name
+
+
+def load_with_adapters(adapter_paths: list, model_name: str = None, backend: str = None,
+                       local_files_only: bool = False) -> tuple:
+    """Load the base model once and attach every adapter to it.
+
+    Returns (model, tokenizer, {path: adapter name}, base model id); 'base' maps
+    to None and is evaluated with adapters disabled.
+    """
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    from backends import CPU_DTYPE, GPU_4BIT, TINY, select_backend
+    from model_manager import MODEL_NAME, four_bit_config
+
+    backend = select_backend(backend)
+    if backend == TINY:
+        from tiny_lm import build_tiny_lm
+        model, tokenizer = build_tiny_lm()
+        source = TINY
+    else:
+        source = model_name or MODEL_NAME
+        tokenizer = AutoTokenizer.from_pretrained(source, local_files_only=local_files_only)
+        tokenizer.pad_token = tokenizer.eos_token
+        if backend == GPU_4BIT:
+            model = AutoModelForCausalLM.from_pretrained(
+                source, quantization_config=four_bit_config(), device_map='auto',
+                low_cpu_mem_usage=True, local_files_only=local_files_only)
+        else:
+            # Adapters stay unmerged for switching, so int8 is not applicable here
+            model = AutoModelForCausalLM.from_pretrained(
+                source, torch_dtype=CPU_DTYPE, low_cpu_mem_usage=True, local_files_only=local_files_only)
+
+    names = {}
+    for path in adapter_paths:
+        if path == BASE:
+            names[path] = None
+            continue
+        from peft import PeftModel
+
+        name = _adapter_name(path, set(names.values()))
+        if isinstance(model, PeftModel):
+            model.load_adapter(path, adapter_name=name, local_files_only=local_files_only)
+        else:
+            model = PeftModel.from_pretrained(model, path, adapter_name=name,
+                                              local_files_only=local_files_only)
+        names[path] = name
+    model.eval()
+    return model, tokenizer, names, source
+
+
+def evaluate_adapter(model, tokenizer, examples: list, model_key: str, cache: PredictionCache = None,
+                     generation_config: dict = None, batch_size: int = 8, workers: int = None,
+                     max_len: int = 256) -> dict:
+    """Perplexity, ROUGE and BLEU for whichever adapter is currently active on `model`."""
+    start = time.perf_counter()
+    texts = [format_text(ex['instruction'], ex['output']) for ex in examples]
+    perplexity = compute_perplexity(model, tokenizer, texts, max_len=max_len, batch_size=max(1, batch_size // 2))
+    t = time.perf_counter()
+    counts = {}
+    predictions = generate_predictions(model, tokenizer, [ex['instruction'] for ex in examples],
+                                       generation_config, batch_size, cache, model_key, stats=counts)
+    generate_s = time.perf_counter() - t
+    scores = compute_metrics(predictions, [ex['output'] for ex in examples], workers)
+    return dict(scores, perplexity=perplexity, examples=len(examples), **counts,
+                generate_s=round(generate_s, 3), total_s=round(time.perf_counter() - start, 3))
+
+
+def compare_adapters(adapter_paths: list, examples: list, cache: PredictionCache = None,
+                     generation_config: dict = None, model_name: str = None, backend: str = None,
+                     batch_size: int = 8, workers: int = None, local_files_only: bool = False) -> dict:
+    """Evaluate each adapter (or 'base') on the same examples with one shared base model."""
+    model, tokenizer, names, base_id = load_with_adapters(adapter_paths, model_name, backend, local_files_only)
+    results = {}
+    for path, name in names.items():
+        model_key = f'{base_id}:{adapter_checksum(path)}'
+        if name is None:
+            context = model.disable_adapter() if hasattr(model, 'disable_adapter') else nullcontext()
+        else:
+            model.set_adapter(name)
+            context = nullcontext()
+        with context:
+            results[path] = evaluate_adapter(model, tokenizer, examples, model_key, cache,
+                                             generation_config, batch_size, workers)
+        print(f'{path}: {results[path]}')
+    return results
+
+
+def format_comparison(results: dict) -> str:
+    """Plain-text table of metrics per adapter, with the change from the first column."""
+    paths = list(results)
+    rows = [('ROUGE-1', 'rouge1'), ('ROUGE-L', 'rougeL'), ('BLEU', 'bleu'), ('Perplexity', 'perplexity')]
+    header = ['Metric'] + [Path(p).name for p in paths]
+    if len(paths) > 1:
+        header.append('Δ last vs first')
+    lines = [header]
+    for label, key in rows:
+        values = [results[p][key] for p in paths]
+        line = [label] + [f'{v:.4f}' for v in values]
+        if len(paths) > 1:
+            first, last = values[0], values[-1]
+            line.append(f'{(last - first) / (first or 1e-9) * 100:+.1f}%')
+        lines.append(line)
+    widths = [max(len(str(row[i])) for row in lines) for i in range(len(header))]
+    return '\n'.join('  '.join(str(cell).ljust(w) for cell, w in zip(row, widths)) for row in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate and compare fine-tuned adapters.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    compare = sub.add_parser('compare', help="Score adapters (paths, Hub ids or 'base') on the eval split")
+    compare.add_argument('adapters', nargs='+')
+    compare.add_argument('--split', default='eval')
+    compare.add_argument('--splits-dir', default=SPLITS_DIR)
+    compare.add_argument('--limit', type=int, default=None)
+    compare.add_argument('--model', default=None, help='Base model (default: google/gemma-2b-it)')
+    compare.add_argument('--backend', default=None, help='gpu-4bit, cpu, tiny or auto')
+    compare.add_argument('--offline', action='store_true')
+    compare.add_argument('--max-new-tokens', type=int, default=512)
+    compare.add_argument('--greedy', action='store_true', help='Deterministic decoding instead of sampling')
+    compare.add_argument('--batch-size', type=int, default=8)
+    compare.add_argument('--workers', type=int, default=None, help='Processes for metric scoring')
+    compare.add_argument('--cache', default=CACHE_PATH, help="sqlite prediction cache (':memory:' to disable)")
+    compare.add_argument('--output', default=None, help='Write results JSON here')
+    args = parser.parse_args()
+
+    config = dict(GREEDY_CONFIG if args.greedy else GENERATION_CONFIG, max_new_tokens=args.max_new_tokens)
+    examples = load_eval_examples(args.splits_dir, args.split, args.limit)
+    cache = PredictionCache(args.cache)
+    try:
+        results = compare_adapters(args.adapters, examples, cache, config, args.model, args.backend,
+                                   args.batch_size, args.workers, args.offline)
+    finally:
+        cache.close()
+
+    print('\n' + format_comparison(results))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
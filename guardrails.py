@@ -0,0 +1,155 @@
+"""
+Compiled guardrail engine for the pre-model gate.
+All rule phrases are compiled into one word-level trie, so a question is
+tokenized once and matched on whole words in time independent of how many
+rules exist. Rules live in a JSON file grouped by category and are
+hot-reloaded on change.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+BLOCK = 'block'
+OUT_OF_DOMAIN = 'out_of_domain'
+IN_DOMAIN = 'in_domain'
+# Precedence order: an in-domain phrase outweighs a stray off-topic word
+# ("meltdowns when the weather changes"), as the original keyword check did
+CATEGORIES = (BLOCK, IN_DOMAIN, OUT_OF_DOMAIN)
+
+# Branches taken by the gate
+BLOCKED = 'blocked'
+OFF_TOPIC = 'off_topic'
+ALLOWED = 'allowed'
+
+
+class Verdict(NamedTuple):
+    branch: str
+    category: str = None
+    rule: str = None
+
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_END = object()   # trie key marking a complete phrase
+
+
+def tokenize(text: str) -> list:
+    """Lowercased word and punctuation tokens; phrases match on these boundaries."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def compile_rules(rules: dict) -> dict:
+    """Compile {category: [phrases]} into a word trie whose leaves hold (category, phrase)."""
+    unknown = set(rules) - set(CATEGORIES)
+    if unknown:
+        raise ValueError(f'Unknown guardrail categories: {sorted(unknown)}')
+    trie = {}
+    for category in CATEGORIES:
+        for phrase in rules.get(category, []):
+            tokens = tokenize(phrase)
+            if not tokens:
+                continue
+            node = trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            # Earlier categories take precedence if a phrase is listed twice
+            node.setdefault(_END, (category, ' '.join(phrase.lower().split())))
+    return trie
+
+
+def _count_rules(node: dict) -> int:
+    return sum(1 if key is _END else _count_rules(child) for key, child in node.items())
+
+
+class GuardrailEngine:
+    """Classifies questions as blocked, off-topic or allowed in one trie pass."""
+
+    def __init__(self, rules: dict, path: str = None, reload_interval: float = 2.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._trie = compile_rules(rules)
+        self._mtime = os.path.getmtime(path) if path else None
+        self._checked_at = time.monotonic()
+        self._hits = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str, reload_interval: float = 2.0) -> 'GuardrailEngine':
+        with open(path, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+        return cls(rules, path=path, reload_interval=reload_interval)
+
+    def classify(self, question: str) -> Verdict:
+        """Return the gate's verdict for one question."""
+        self._maybe_reload()
+        trie = self._trie
+        tokens = tokenize(question)
+        found = {}
+        for start in range(len(tokens)):
+            node, match = trie, None
+            for i in range(start, len(tokens)):
+                node = node.get(tokens[i])
+                if node is None:
+                    break
+                match = node.get(_END, match)
+            if match is not None:
+                category, rule = match
+                found.setdefault(category, rule)
+                if category == BLOCK:
+                    break
+
+        if BLOCK in found:
+            verdict = Verdict(BLOCKED, BLOCK, found[BLOCK])
+        elif IN_DOMAIN in found:
+            verdict = Verdict(ALLOWED, IN_DOMAIN, found[IN_DOMAIN])
+        elif OUT_OF_DOMAIN in found:
+            verdict = Verdict(OFF_TOPIC, OUT_OF_DOMAIN, found[OUT_OF_DOMAIN])
+        else:
+            verdict = Verdict(OFF_TOPIC)
+
+        if verdict.rule is not None:
+            with self._lock:
+                self._hits[(verdict.category, verdict.rule)] += 1
+        return verdict
+
+    def classify_batch(self, questions: list) -> list:
+        """Classify many questions; returns verdicts in input order."""
+        return [self.classify(q) for q in questions]
+
+    def hit_counts(self) -> dict:
+        """Per-rule hit counters keyed by 'category:phrase'."""
+        with self._lock:
+            return {f'{category}:{rule}': n for (category, rule), n in self._hits.items()}
+
+    def reload(self):
+        """Re-read the rules file; keeps the current rules if it fails to parse."""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                trie = compile_rules(json.load(f))
+        except (OSError, ValueError) as exc:
+            logger.warning('Guardrail reload failed, keeping previous rules: %s', exc)
+            return
+        self._trie, self._mtime = trie, mtime
+        logger.info('Reloaded %d guardrail rules from %s', _count_rules(trie), self.path)
+
+    def _maybe_reload(self):
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            changed = os.path.getmtime(self.path) != self._mtime
+        except OSError:
+            return
+        if changed:
+            self.reload()
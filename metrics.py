@@ -0,0 +1,217 @@
+"""
+Per-request instrumentation for the inference pipeline.
+Stage timings, token counts, guardrail branch and queue wait are aggregated
+into histograms and rendered in Prometheus text format; each request can
+also be logged as one JSON line.
+
+Enable with AUTISM_METRICS=1 (and AUTISM_REQUEST_LOG=1 for JSON logs).
+When disabled, start_trace() returns a shared no-op trace.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+ENABLED = os.environ.get('AUTISM_METRICS', '0') == '1'
+REQUEST_LOG = os.environ.get('AUTISM_REQUEST_LOG', '0') == '1'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+request_logger = logging.getLogger('autism.requests')
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                    cumulative += count
+                    le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                    lines.append(f'{self.name}_bucket{le} {cumulative}')
+                base = _format_labels(self.labelnames, labels)
+                lines.append(f'{self.name}_sum{base} {series[-1]}')
+                lines.append(f'{self.name}_count{base} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Holds metrics plus collectors that report live gauges at scrape time."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: tuple, labelnames: tuple = ()) -> Histogram:
+        metric = Histogram(name, help_text, buckets, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name: str, help_text: str, collect, labelname: str = None):
+        """`collect()` returns a number, or a {label value: number} dict when labelled."""
+        self._collectors.append((name, help_text, collect, labelname))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help_text, collect, labelname in self._collectors:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            value = collect()
+            if labelname is None:
+                lines.append(f'{name} {value}')
+            else:
+                for label, v in sorted(value.items()):
+                    lines.append(f'{name}{{{labelname}="{_escape(label)}"}} {v}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.counter(
+    'autism_requests_total', 'Chat requests by guardrail/cache branch.', ('branch',))
+REQUEST_SECONDS = REGISTRY.histogram(
+    'autism_request_seconds', 'End-to-end safe_chat latency.', LATENCY_BUCKETS, ('branch',))
+STAGE_SECONDS = REGISTRY.histogram(
+    'autism_stage_seconds', 'Time spent per pipeline stage.', LATENCY_BUCKETS, ('stage',))
+PROMPT_TOKENS = REGISTRY.histogram(
+    'autism_prompt_tokens', 'Prompt tokens per generated request.', TOKEN_BUCKETS)
+COMPLETION_TOKENS = REGISTRY.histogram(
+    'autism_completion_tokens', 'Completion tokens per generated request.', TOKEN_BUCKETS)
+BATCH_SIZE = REGISTRY.histogram(
+    'autism_batch_size', 'Size of the batch each generated request ran in.', BATCH_BUCKETS)
+
+
+class RequestTrace:
+    """Collects one request's stage timings and counts, then records them on finish."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.branch = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.batch_size = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def record_generation(self, request):
+        """Copy queue wait, prefill and decode timings from a finished GenerationRequest."""
+        self.prompt_tokens = len(request.prompt_ids)
+        self.completion_tokens = len(request.output_ids or [])
+        self.batch_size = request.batch_size
+        if request.started_at is not None:
+            self.stages['queue_wait'] = request.started_at - request.enqueued_at
+            first = request.first_token_at or request.finished_at
+            self.stages['prefill'] = first - request.started_at
+            self.stages['decode'] = request.finished_at - first
+
+    def finish(self, branch: str):
+        self.branch = branch
+        total = time.perf_counter() - self.start
+        REQUESTS.inc(branch)
+        REQUEST_SECONDS.observe(total, branch)
+        for name, seconds in self.stages.items():
+            STAGE_SECONDS.observe(seconds, name)
+        if self.prompt_tokens is not None:
+            PROMPT_TOKENS.observe(self.prompt_tokens)
+            COMPLETION_TOKENS.observe(self.completion_tokens)
+            BATCH_SIZE.observe(self.batch_size)
+        if REQUEST_LOG:
+            request_logger.info(json.dumps({
+                'branch': branch,
+                'total_ms': round(total * 1000, 3),
+                'stages_ms': {k: round(v * 1000, 3) for k, v in self.stages.items()},
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'batch_size': self.batch_size,
+            }))
+
+
+class _NullTrace:
+    """Stand-in used when metrics are disabled; every method is a no-op."""
+
+    _context = nullcontext()
+
+    def stage(self, name: str):
+        return self._context
+
+    def record_generation(self, request):
+        pass
+
+    def finish(self, branch: str):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+def start_trace():
+    return RequestTrace() if ENABLED else NULL_TRACE
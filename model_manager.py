@@ -0,0 +1,334 @@
+"""
+Model loading for the chatbot: lazy or in a background thread, with a
+readiness state the UI can show and per-phase startup timings. The backend
+(GPU 4-bit, CPU int8, CPU fp32) is chosen by backends.select_backend().
+
+With `adapters` (name -> path), several LoRA adapters are attached unmerged
+to one base model so requests can switch between them (see adapters.py).
+
+Also provides a one-time merge-and-export step that folds the LoRA weights
+into the base model and saves safetensors for fast, mmap-friendly loading:
+    python model_manager.py export --output autism_guidance_gemma_2b_merged
+"""
+
+import argparse
+import hashlib
+import threading
+import time
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+
+from adapters import BASE
+from backends import (
+    CPU_DTYPE, CPU_INT8, TINY, configure_cpu_threads, is_cpu, quantize_int8, select_backend,
+)
+
+MODEL_NAME = 'google/gemma-2b-it'
+ADAPTER_HUB_ID = 'Rele22/autism-guidance-gemma-2b'
+LOCAL_ADAPTER_DIR = 'autism_guidance_gemma_2b'
+MERGED_MODEL_DIR = 'autism_guidance_gemma_2b_merged'
+
+IDLE = 'idle'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+ADAPTER_WEIGHT_FILES = ('adapter_model.safetensors', 'adapter_model.bin')
+
+
+def has_adapter_weights(path: str) -> bool:
+    return any((Path(path) / name).exists() for name in ADAPTER_WEIGHT_FILES)
+
+
+def resolve_adapter_path(local_dir: str = LOCAL_ADAPTER_DIR, hub_id: str = ADAPTER_HUB_ID) -> str:
+    """Prefer the local fine-tuned adapter directory when it holds weights."""
+    return local_dir if has_adapter_weights(local_dir) else hub_id
+
+
+def weights_fingerprint(path: str) -> str:
+    """Cheap identity of local weights (file names, sizes, mtimes); Hub ids use their name."""
+    directory = Path(path)
+    if not directory.is_dir():
+        return f'hub:{path}'
+    digest = hashlib.sha256()
+    for file in sorted(directory.iterdir()):
+        if file.is_file() and file.suffix in ('.json', '.safetensors', '.bin'):
+            stat = file.stat()
+            digest.update(f'{file.name}:{stat.st_size}:{stat.st_mtime_ns}'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def is_merged_model(path: str) -> bool:
+    return path is not None and (Path(path) / 'config.json').exists()
+
+
+def four_bit_config() -> BitsAndBytesConfig:
+    """NF4 quantization used to fit the base model on a small GPU (same as fine-tuning)."""
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type='nf4',
+        bnb_4bit_compute_dtype=torch.bfloat16,
+        bnb_4bit_use_double_quant=True,
+    )
+
+
+class ModelManager:
+    """Owns the tokenizer and model; loads them once, lazily or in the background."""
+
+    def __init__(self, model_name: str = MODEL_NAME, adapter_path: str = None,
+                 merged_path: str = MERGED_MODEL_DIR, local_files_only: bool = False,
+                 backend: str = None, adapters: dict = None):
+        self.model_name = model_name
+        self.backend = select_backend(backend)
+        self.adapter_path = adapter_path or resolve_adapter_path()
+        # Multi-adapter serving keeps every adapter unmerged on the base model
+        self.adapters = {name: path for name, path in (adapters or {}).items() if name != BASE} or None
+        self.merged_path = merged_path
+        self.local_files_only = local_files_only
+        self.state = IDLE
+        self.error = None
+        self.timings = {}
+        self.model = None
+        self.tokenizer = None
+        self._lock = threading.Lock()
+        self._tokenizer_ready = threading.Event()
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Begin loading in a background thread; returns immediately."""
+        with self._lock:
+            if self.state != IDLE:
+                return
+            self.state = LOADING
+            self._thread = threading.Thread(target=self._load, name='model-loader', daemon=True)
+            self._thread.start()
+
+    def load(self):
+        """Load synchronously (no-op if already loaded or loading elsewhere)."""
+        with self._lock:
+            owner = self.state == IDLE
+            if owner:
+                self.state = LOADING
+        if owner:
+            self._load()
+        self._done.wait()
+
+    def get(self, timeout: float = None) -> tuple:
+        """Return (model, tokenizer), loading on first use and waiting until ready."""
+        if self.state == IDLE:
+            self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError('Model is still loading')
+        if self.state == FAILED:
+            raise RuntimeError(f'Model failed to load: {self.error}')
+        return self.model, self.tokenizer
+
+    def get_tokenizer(self, timeout: float = None):
+        """Return the tokenizer, which is ready well before the model."""
+        if self.state == IDLE:
+            self.start()
+        if not self._tokenizer_ready.wait(timeout):
+            raise TimeoutError('Tokenizer is still loading')
+        if self.tokenizer is None:
+            raise RuntimeError(f'Model failed to load: {self.error}')
+        return self.tokenizer
+
+    def fingerprint(self) -> str:
+        """Identifies the weights served (the first adapter when there are several)."""
+        if self.backend == TINY:
+            return TINY
+        if self.adapters:
+            return f'{self.model_name}+{weights_fingerprint(next(iter(self.adapters.values())))}'
+        if is_merged_model(self.merged_path):
+            return f'merged:{weights_fingerprint(self.merged_path)}'
+        return f'{self.model_name}+{weights_fingerprint(self.adapter_path)}'
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def status_text(self) -> str:
+        """One-line readiness message for the UI."""
+        if self.state == READY:
+            return f'✅ Model ready on {self.backend} (loaded in {self.timings.get("total", 0):.1f}s)'
+        if self.state == FAILED:
+            return f'❌ Model failed to load: {self.error}'
+        if self.state == LOADING:
+            phase = next(reversed(self.timings), None)
+            return '⏳ Loading model...' + (f' ({phase} done)' if phase else '')
+        return '⏳ Model not loaded yet'
+
+    def _phase(self, name: str, start: float) -> float:
+        now = time.perf_counter()
+        self.timings[name] = round(now - start, 3)
+        return now
+
+    def _load_gpu_4bit(self, source: str, merged: bool, t: float):
+        model = AutoModelForCausalLM.from_pretrained(
+            source,
+            quantization_config=four_bit_config(),
+            device_map='auto',
+            low_cpu_mem_usage=True,
+            local_files_only=self.local_files_only,
+        )
+        t = self._phase('merged_model' if merged else 'base_model', t)
+        if not merged:
+            model = self._attach_adapter(model)
+            self._phase('adapter', t)
+        return model
+
+    def _load_cpu(self, source: str, merged: bool, t: float):
+        print(f"CPU threads: {configure_cpu_threads()}")
+        model = AutoModelForCausalLM.from_pretrained(
+            source,
+            torch_dtype=CPU_DTYPE,
+            low_cpu_mem_usage=True,
+            local_files_only=self.local_files_only,
+        )
+        t = self._phase('merged_model' if merged else 'base_model', t)
+        if self.adapters:
+            model = self._attach_adapter(model)
+            t = self._phase('adapter', t)
+        elif not merged:
+            # LoRA must be folded into the fp32 weights before they are quantized
+            model = self._attach_adapter(model).merge_and_unload()
+            t = self._phase('adapter', t)
+        if self.backend == CPU_INT8 and self.adapters:
+            print("Adapters stay unmerged for switching, so int8 quantization is skipped")
+        elif self.backend == CPU_INT8:
+            quantize_int8(model)
+            self._phase('quantize', t)
+        return model
+
+    def _attach_adapter(self, model):
+        from peft import PeftModel
+
+        if not self.adapters:
+            print(f"Loading LoRA adapter from {self.adapter_path}...")
+            return PeftModel.from_pretrained(
+                model, self.adapter_path, local_files_only=self.local_files_only,
+            )
+        for name, path in self.adapters.items():
+            print(f"Loading LoRA adapter '{name}' from {path}...")
+            if isinstance(model, PeftModel):
+                model.load_adapter(path, adapter_name=name, local_files_only=self.local_files_only)
+            else:
+                model = PeftModel.from_pretrained(
+                    model, path, adapter_name=name, local_files_only=self.local_files_only,
+                )
+        return model
+
+    def _load_tiny(self, t: float):
+        from tiny_lm import build_tiny_lm
+
+        print("Building tiny stand-in model...")
+        model, self.tokenizer = build_tiny_lm()
+        self.tokenizer.padding_side = 'left'
+        self._tokenizer_ready.set()
+        t = self._phase('tiny_model', t)
+        if self.adapters:
+            model = self._attach_adapter(model)
+            self._phase('adapter', t)
+        return model
+
+    def _load(self):
+        t_start = t = time.perf_counter()
+        try:
+            if self.backend == TINY:
+                model = self._load_tiny(t)
+            else:
+                merged = not self.adapters and is_merged_model(self.merged_path)
+                source = self.merged_path if merged else self.model_name
+
+                print("Loading tokenizer...")
+                self.tokenizer = AutoTokenizer.from_pretrained(source, local_files_only=self.local_files_only)
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+                self.tokenizer.padding_side = 'left'
+                self._tokenizer_ready.set()
+                t = self._phase('tokenizer', t)
+
+                print(f"Loading {'merged' if merged else 'base'} model from {source} ({self.backend})...")
+                if is_cpu(self.backend):
+                    model = self._load_cpu(source, merged, t)
+                else:
+                    model = self._load_gpu_4bit(source, merged, t)
+
+            model.eval()
+            self.model = model
+            self._phase('total', t_start)
+            self.state = READY
+            print(f"✓ Model loaded successfully! {self.timings}")
+        except Exception as exc:
+            self.error = exc
+            self.state = FAILED
+            print(f"✗ Model failed to load: {exc}")
+        finally:
+            self._tokenizer_ready.set()
+            self._done.set()
+
+
+def export_merged(model_name: str, adapter_path: str, output_dir: str,
+                  dtype: torch.dtype = torch.bfloat16, local_files_only: bool = False) -> dict:
+    """Fold LoRA weights into the base model and save it as safetensors.
+
+    The base is loaded unquantized: merging into 4-bit weights is lossy, and the
+    exported checkpoint is re-quantized at load time instead.
+    """
+    from peft import PeftModel
+
+    timings = {}
+    t_start = t = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+    base = AutoModelForCausalLM.from_pretrained(
+        model_name, torch_dtype=dtype, low_cpu_mem_usage=True, local_files_only=local_files_only,
+    )
+    timings['base_model'] = round(time.perf_counter() - t, 3)
+
+    t = time.perf_counter()
+    model = PeftModel.from_pretrained(base, adapter_path, local_files_only=local_files_only)
+    model = model.merge_and_unload()
+    timings['merge'] = round(time.perf_counter() - t, 3)
+
+    t = time.perf_counter()
+    model.save_pretrained(output_dir, safe_serialization=True)
+    tokenizer.save_pretrained(output_dir)
+    timings['save'] = round(time.perf_counter() - t, 3)
+    timings['total'] = round(time.perf_counter() - t_start, 3)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Model loading utilities for the chatbot.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    export = sub.add_parser('export', help='Merge the LoRA adapter into the base model')
+    export.add_argument('--model', default=MODEL_NAME)
+    export.add_argument('--adapter', default=None, help='Adapter dir or Hub id (default: local if present)')
+    export.add_argument('--output', default=MERGED_MODEL_DIR)
+    export.add_argument('--offline', action='store_true', help='Only use locally cached files')
+
+    load = sub.add_parser('load', help='Load the serving model and report startup timings')
+    load.add_argument('--model', default=MODEL_NAME)
+    load.add_argument('--adapter', default=None)
+    load.add_argument('--merged', default=MERGED_MODEL_DIR)
+    load.add_argument('--offline', action='store_true')
+    load.add_argument('--backend', default=None, help='gpu-4bit, cpu-int8, cpu or auto')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        adapter = args.adapter or resolve_adapter_path()
+        print(f'Merging {adapter} into {args.model} -> {args.output}')
+        timings = export_merged(args.model, adapter, args.output, local_files_only=args.offline)
+        print(f'✓ Exported merged model to {args.output} {timings}')
+    else:
+        manager = ModelManager(args.model, args.adapter, args.merged,
+                               local_files_only=args.offline, backend=args.backend)
+        manager.load()
+        print(manager.status_text())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Tokenize the train/eval shards from create_dataset.py once with the Gemma
+chat template and pack them into sequences of up to --seq-len tokens, stored
+as flat numpy memmaps. Fine-tuning and evaluation runs then read token ids
+straight from disk instead of re-tokenizing the JSONL on every run.
+
+    python pack_dataset.py                        # data/splits -> data/packed
+    python pack_dataset.py --seq-len 256 --tiny   # tiny stand-in tokenizer, no download
+
+Files per split in the output directory:
+  <split>.tokens.bin       token ids of every packed sequence, back to back
+  <split>.loss_mask.bin    1 where the token belongs to a model response (uint8)
+  <split>.seq_offsets.bin  start of each packed sequence, plus the end (int64)
+  <split>.doc_offsets.bin  start of each example in the token stream, plus the end (int64)
+meta.json records dtypes, counts, the tokenizer and a checksum of the source
+shards; a split whose sources and settings are unchanged is not re-packed.
+
+Examples are expanded by their `weight`: pass r emits every example whose
+weight exceeds r, so copies of one example are spread across the epoch.
+Memory use is independent of corpus size.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from prompts import build_prompt
+
+SPLITS_DIR = 'data/splits'
+PACKED_DIR = 'data/packed'
+SEQ_LEN = 256
+SPLITS = ('train', 'eval')
+TEMPLATE_VERSION = 1   # bump when the text layout below changes
+
+
+def example_ids(tokenizer, example: dict) -> tuple:
+    """(token ids, loss mask) for one example in the fine-tuning template."""
+    instruction = (example.get('instruction') or '').strip()
+    output = (example.get('output') or '').strip()
+    if not instruction or not output:
+        return None, None
+    prompt = tokenizer(build_prompt(instruction))['input_ids']
+    response = tokenizer(f'{output}<end_of_turn>', add_special_tokens=False)['input_ids']
+    response.append(tokenizer.eos_token_id)
+    return prompt + response, [0] * len(prompt) + [1] * len(response)
+
+
+def iter_shards(paths: list):
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def sources_checksum(paths: list) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def token_dtype(tokenizer) -> str:
+    return 'uint16' if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else 'uint32'
+
+
+def pack_split(tokenizer, shard_paths: list, output_dir: str, split: str, seq_len: int = SEQ_LEN) -> dict:
+    """Tokenize a split's unique examples once, then pack their weighted copies."""
+    dtype = np.dtype(token_dtype(tokenizer))
+    out = Path(output_dir)
+    stats = {'examples': 0, 'dropped_too_long': 0, 'dropped_empty': 0}
+
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmp:
+        # Pass 1: tokenize each unique example once into a scratch memmap
+        unique_tokens = Path(tmp) / 'tokens.bin'
+        unique_mask = Path(tmp) / 'mask.bin'
+        starts, lengths, weights = array('q'), array('q'), array('q')
+        position = 0
+        with open(unique_tokens, 'wb') as tf, open(unique_mask, 'wb') as mf:
+            for example in iter_shards(shard_paths):
+                ids, mask = example_ids(tokenizer, example)
+                if ids is None:
+                    stats['dropped_empty'] += 1
+                    continue
+                if len(ids) > seq_len:
+                    stats['dropped_too_long'] += 1
+                    continue
+                tf.write(np.asarray(ids, dtype=dtype).tobytes())
+                mf.write(np.asarray(mask, dtype=np.uint8).tobytes())
+                starts.append(position)
+                lengths.append(len(ids))
+                weights.append(max(1, int(example.get('weight', 1))))
+                position += len(ids)
+                stats['examples'] += 1
+
+        tokens_in = np.memmap(unique_tokens, dtype=dtype, mode='r') if position else np.zeros(0, dtype)
+        mask_in = np.memmap(unique_mask, dtype=np.uint8, mode='r') if position else np.zeros(0, np.uint8)
+
+        # Pass 2: next-fit packing in stream order (a sequence is closed once the
+        # next example does not fit), one pass per unit of weight
+        seq_offsets, doc_offsets = array('q', [0]), array('q')
+        written = current = 0
+        with open(out / f'{split}.tokens.bin', 'wb') as tf, open(out / f'{split}.loss_mask.bin', 'wb') as mf:
+            for r in range(max(weights, default=0)):
+                for start, length, weight in zip(starts, lengths, weights):
+                    if weight <= r:
+                        continue
+                    if current and current + length > seq_len:
+                        seq_offsets.append(written)
+                        current = 0
+                    doc_offsets.append(written)
+                    tf.write(tokens_in[start:start + length].tobytes())
+                    mf.write(mask_in[start:start + length].tobytes())
+                    written += length
+                    current += length
+        if current:
+            seq_offsets.append(written)
+        doc_offsets.append(written)
+        del tokens_in, mask_in
+
+    np.asarray(seq_offsets, dtype=np.int64).tofile(out / f'{split}.seq_offsets.bin')
+    np.asarray(doc_offsets, dtype=np.int64).tofile(out / f'{split}.doc_offsets.bin')
+    stats.update({
+        'weighted_examples': len(doc_offsets) - 1,
+        'sequences': len(seq_offsets) - 1,
+        'tokens': written,
+        'fill': round(written / ((len(seq_offsets) - 1) * seq_len), 4) if len(seq_offsets) > 1 else None,
+    })
+    return stats
+
+
+def pack_dataset(tokenizer, tokenizer_name: str, splits_dir: str = SPLITS_DIR,
+                 output_dir: str = PACKED_DIR, seq_len: int = SEQ_LEN, force: bool = False) -> dict:
+    """Pack every split listed in the splits manifest; returns the written meta."""
+    with open(Path(splits_dir) / 'manifest.json', 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    meta_path = Path(output_dir) / 'meta.json'
+    meta = {}
+    if meta_path.exists():
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+    settings = {'tokenizer': tokenizer_name, 'seq_len': seq_len, 'template_version': TEMPLATE_VERSION,
+                'token_dtype': token_dtype(tokenizer), 'eos_token_id': tokenizer.eos_token_id,
+                'pad_token_id': tokenizer.pad_token_id}
+    splits = meta.get('splits', {}) if meta.get('settings') == settings else {}
+    for split in SPLITS:
+        paths = manifest['splits'][split]['shards']
+        checksum = sources_checksum(paths)
+        cached = splits.get(split)
+        if not force and cached and cached['source_sha256'] == checksum and \
+                os.path.exists(Path(output_dir) / f'{split}.tokens.bin'):
+            print(f'{split}: unchanged, skipping')
+            continue
+        stats = pack_split(tokenizer, paths, output_dir, split, seq_len)
+        splits[split] = dict(stats, source_sha256=checksum)
+        print(f'{split}: {stats}')
+
+    meta = {'settings': settings, 'splits': splits}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class PackedDataset:
+    """Read-only view of a packed split; items are numpy arrays ready for a causal LM.
+
+    `labels` are -100 outside model responses, and `position_ids` restart at each
+    packed example. Position ids alone do not stop examples attending to each
+    other under SDPA or eager attention; `collate_packed` builds the mask that does.
+    """
+
+    def __init__(self, directory: str = PACKED_DIR, split: str = 'train'):
+        with open(Path(directory) / 'meta.json', 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        dtype = self.meta['settings']['token_dtype']
+        prefix = Path(directory) / split
+        self.tokens = np.memmap(f'{prefix}.tokens.bin', dtype=dtype, mode='r')
+        self.loss_mask = np.memmap(f'{prefix}.loss_mask.bin', dtype=np.uint8, mode='r')
+        self.seq_offsets = np.fromfile(f'{prefix}.seq_offsets.bin', dtype=np.int64)
+        self.doc_offsets = np.fromfile(f'{prefix}.doc_offsets.bin', dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.seq_offsets) - 1
+
+    def __getitem__(self, index: int) -> dict:
+        start, end = self.seq_offsets[index], self.seq_offsets[index + 1]
+        input_ids = self.tokens[start:end].astype(np.int64)
+        labels = np.where(self.loss_mask[start:end] == 1, input_ids, -100)
+        # Document starts inside this sequence reset the position counter
+        lo, hi = np.searchsorted(self.doc_offsets, [start, end])
+        doc_starts = self.doc_offsets[lo:hi] - start
+        positions = np.arange(end - start) - np.repeat(doc_starts, np.diff(np.append(doc_starts, end - start)))
+        return {'input_ids': input_ids, 'labels': labels, 'position_ids': positions}
+
+    @property
+    def num_examples(self) -> int:
+        return len(self.doc_offsets) - 1
+
+    def example(self, index: int) -> dict:
+        """One packed example on its own (input_ids and labels), e.g. for per-example scoring."""
+        start, end = self.doc_offsets[index], self.doc_offsets[index + 1]
+        input_ids = self.tokens[start:end].astype(np.int64)
+        return {'input_ids': input_ids, 'labels': np.where(self.loss_mask[start:end] == 1, input_ids, -100)}
+
+
+def collate_packed(features: list, pad_token_id: int, dtype=None) -> dict:
+    """Right-pad PackedDataset items into a batch of tensors for the Trainer.
+
+    `attention_mask` is a 4D additive mask (0 = attend) that is causal within
+    each packed example and blocks attention across examples, so each example
+    sees the same context as it would alone. `dtype` should match the model's
+    compute dtype (float32 by default).
+    """
+    import torch
+
+    dtype = dtype or torch.float32
+    width = max(len(f['input_ids']) for f in features)
+    batch = {
+        'input_ids': torch.full((len(features), width), pad_token_id, dtype=torch.long),
+        'labels': torch.full((len(features), width), -100, dtype=torch.long),
+        'position_ids': torch.zeros((len(features), width), dtype=torch.long),
+        'attention_mask': torch.full((len(features), 1, width, width), torch.finfo(dtype).min, dtype=dtype),
+    }
+    # Every token may attend to itself, so padded rows never softmax over nothing
+    diagonal = torch.arange(width)
+    batch['attention_mask'][:, 0, diagonal, diagonal] = 0
+    for row, feature in enumerate(features):
+        n = len(feature['input_ids'])
+        for key in ('input_ids', 'labels', 'position_ids'):
+            batch[key][row, :n] = torch.as_tensor(feature[key], dtype=torch.long)
+        example = torch.cumsum(batch['position_ids'][row, :n] == 0, 0)
+        allowed = (example[:, None] == example[None, :]).tril()
+        batch['attention_mask'][row, 0, :n, :n].masked_fill_(allowed, 0)
+    return batch
+
+def main():
+    parser = argparse.ArgumentParser(description='Tokenize and pack the dataset splits into memmaps.')
+    parser.add_argument('--splits-dir', default=SPLITS_DIR)
+    parser.add_argument('--output', default=PACKED_DIR)
+    parser.add_argument('--seq-len', type=int, default=SEQ_LEN)
+    parser.add_argument('--tokenizer', default='google/gemma-2b-it')
+    parser.add_argument('--tiny', action='store_true', help='Use the tiny stand-in tokenizer')
+    parser.add_argument('--force', action='store_true', help='Re-pack even if sources are unchanged')
+    args = parser.parse_args()
+
+    if args.tiny:
+        from tiny_lm import build_tiny_tokenizer
+        tokenizer, name = build_tiny_tokenizer(), 'tiny'
+    else:
+        from transformers import AutoTokenizer
+        tokenizer, name = AutoTokenizer.from_pretrained(args.tokenizer), args.tokenizer
+        tokenizer.pad_token = tokenizer.eos_token
+    pack_dataset(tokenizer, name, args.splits_dir, args.output, args.seq_len, args.force)
+
+
+if __name__ == '__main__':
+    main()
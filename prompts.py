@@ -0,0 +1,38 @@
+"""
+Gemma-2B-IT chat template helpers shared by the app and tooling.
+Matches the format used for fine-tuning:
+<start_of_turn>user\n{question}<end_of_turn>\n<start_of_turn>model\n{response}<end_of_turn>
+"""
+
+END_OF_TURN = '<end_of_turn>\n'
+
+
+def user_turn(text: str) -> str:
+    """A complete user turn followed by the model-turn opener."""
+    return f'<start_of_turn>user\n{text}{END_OF_TURN}<start_of_turn>model\n'
+
+
+def model_turn(text: str) -> str:
+    """Close out a model turn with its response text."""
+    return f'{text}{END_OF_TURN}'
+
+
+def with_context(question: str, passages=None) -> str:
+    """Prefix a question with retrieved reference passages, if any."""
+    if not passages:
+        return question
+    reference = '\n'.join(f'- {passage}' for passage in passages)
+    return f'Reference information:\n{reference}\n\nQuestion: {question}'
+
+
+def build_prompt(question: str, context=None) -> str:
+    """Wrap a single question (and optional reference passages) in the Gemma-2B-IT chat template."""
+    return user_turn(with_context(question, context))
+
+
+def build_conversation(turns: list, question: str = None, context=None) -> str:
+    """Render (user, model) turns, optionally opening a new turn for `question`."""
+    text = ''.join(user_turn(user) + model_turn(answer) for user, answer in turns)
+    if question is not None:
+        text += user_turn(with_context(question, context))
+    return text
@@ -0,0 +1,420 @@
+"""
+Retrieval over the curated guidance corpus (data/autism_screening_guidance.jsonl).
+
+A BM25 index over each example's question and answer is built once into
+data/index/ as flat numpy arrays (CSR postings) that are memory-mapped at
+startup. Each lookup either
+  - returns the curated answer directly when the question asks the same thing
+    as a corpus question: n-gram similarity pre-filters, and the content words,
+    numbers and negations must then match exactly (no model call), or
+  - returns the top passages above a relevance threshold for grounding the prompt.
+
+Corpus edits are picked up incrementally: new or changed examples go into a
+small in-memory delta segment and removed ones are tombstoned; the on-disk
+index is rebuilt once the delta grows past a fraction of it.
+
+    python retrieval.py build
+    python retrieval.py query "What are early signs of autism in toddlers?"
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from answer_cache import _cosine, ngram_vector, normalize_question
+
+CORPUS_PATH = 'data/autism_screening_guidance.jsonl'
+INDEX_DIR = 'data/index'
+INDEX_VERSION = 1
+# Refusal templates: fine to serve verbatim, not useful as grounding
+UNGROUNDED_CATEGORIES = frozenset({'out_of_domain'})
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Negations are kept: "not"/"no" change what a question is asking
+STOPWORDS = frozenset('''
+    a an the is are was were be been being of to in on at for and or my me i it its this
+    that do does did can could should would what how when why with about your you our
+    their his her they he she we us am has have had if so as by from into than then
+    there these those which who whom will just also any some very
+'''.split())
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def analyze(text: str) -> list:
+    """Lowercased content words with plural -s folded, for indexing and queries."""
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+def same_terms(question: str, other: str) -> bool:
+    """Whether two questions share exactly the same content terms, numbers and negations included.
+
+    Character n-grams cannot tell "before age 2" from "before age 5", or
+    "should I worry" from "should I not worry"; this can.
+    """
+    return Counter(analyze(question)) == Counter(analyze(other))
+
+
+def read_corpus(path: str = CORPUS_PATH):
+    """Yield {'id', 'instruction', 'answer', 'category'} for each corpus example."""
+    from create_dataset import DISCLAIMER, content_hash
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            instruction = (record.get('instruction') or '').strip()
+            output = (record.get('output') or '').strip()
+            if not instruction or not output:
+                continue
+            yield {
+                'id': record.get('id') or content_hash(record).hex(),
+                'instruction': instruction,
+                # The app appends its own disclaimer to every reply
+                'answer': output.removesuffix(DISCLAIMER.strip()).strip(),
+                'category': record.get('category'),
+            }
+
+
+def _doc_terms(doc: dict) -> list:
+    return analyze(f"{doc['instruction']} {doc['answer']}")
+
+
+class Hit(NamedTuple):
+    doc_id: str
+    instruction: str
+    answer: str
+    category: str
+    relevance: float    # BM25 score / best score the query could reach, in [0, 1]
+    similarity: float   # character n-gram cosine between the question and `instruction`
+
+
+class Retrieval(NamedTuple):
+    answer: Hit = None      # set when the fast path applies
+    passages: tuple = ()    # grounding passages otherwise
+
+
+class _Segment:
+    """CSR postings for a set of documents, either memory-mapped or in memory."""
+
+    def __init__(self, vocab: dict, indptr, postings, tf, doc_len, ids: list, docs):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.postings = postings
+        self.tf = tf
+        self.doc_len = doc_len
+        self.ids = ids
+        self.docs = docs
+        self.n = len(ids)
+        self.total_len = int(doc_len.sum()) if self.n else 0
+
+    @classmethod
+    def from_docs(cls, docs: list) -> '_Segment':
+        arrays = _build_arrays([_doc_terms(d) for d in docs])
+        return cls(*arrays, ids=[d['id'] for d in docs], docs=docs)
+
+    @classmethod
+    def load(cls, directory: str) -> '_Segment':
+        directory = Path(directory)
+        with open(directory / 'vocab.json', 'r', encoding='utf-8') as f:
+            vocab = json.load(f)
+        with open(directory / 'ids.json', 'r', encoding='utf-8') as f:
+            ids = json.load(f)
+        arrays = [np.load(directory / f'{name}.npy', mmap_mode='r')
+                  for name in ('indptr', 'postings', 'tf', 'doc_len')]
+        return cls(vocab, *arrays, ids=ids, docs=_DocStore(directory))
+
+    def df(self, term: str) -> int:
+        row = self.vocab.get(term)
+        return 0 if row is None else int(self.indptr[row + 1] - self.indptr[row])
+
+    def term_postings(self, term: str):
+        row = self.vocab.get(term)
+        if row is None:
+            return None
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.postings[start:end], self.tf[start:end]
+
+
+class _DocStore:
+    """Random access to stored documents through a memory map of docs.jsonl."""
+
+    def __init__(self, directory: Path):
+        self._offsets = np.load(directory / 'doc_offsets.npy', mmap_mode='r')
+        size = os.path.getsize(directory / 'docs.jsonl')
+        self._data = np.memmap(directory / 'docs.jsonl', dtype=np.uint8, mode='r') if size else b''
+
+    def __getitem__(self, index: int) -> dict:
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return json.loads(bytes(self._data[start:end]))
+
+
+def _build_arrays(doc_terms: list) -> tuple:
+    postings = {}
+    for doc, terms in enumerate(doc_terms):
+        for term, count in Counter(terms).items():
+            postings.setdefault(term, []).append((doc, count))
+    vocab = {term: row for row, term in enumerate(sorted(postings))}
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    for term, row in vocab.items():
+        indptr[row + 1] = len(postings[term])
+    np.cumsum(indptr, out=indptr)
+    doc_ids = np.empty(indptr[-1], dtype=np.int32)
+    tf = np.empty(indptr[-1], dtype=np.uint16)
+    for term, row in vocab.items():
+        entries = postings[term]
+        doc_ids[indptr[row]:indptr[row + 1]] = [d for d, _ in entries]
+        tf[indptr[row]:indptr[row + 1]] = [min(c, 65535) for _, c in entries]
+    doc_len = np.asarray([len(t) for t in doc_terms], dtype=np.int32)
+    return vocab, indptr, doc_ids, tf, doc_len
+
+
+def build_index(corpus_path: str = CORPUS_PATH, index_dir: str = INDEX_DIR) -> dict:
+    """Build the on-disk index for the corpus and swap it in atomically."""
+    mtime = os.path.getmtime(corpus_path)
+    docs = list(read_corpus(corpus_path))
+    vocab, indptr, postings, tf, doc_len = _build_arrays([_doc_terms(d) for d in docs])
+
+    tmp = Path(f'{index_dir}.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    offsets = [0]
+    with open(tmp / 'docs.jsonl', 'wb') as f:
+        for doc in docs:
+            data = (json.dumps(doc, ensure_ascii=False) + '\n').encode('utf-8')
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+    np.save(tmp / 'doc_offsets.npy', np.asarray(offsets, dtype=np.int64))
+    for name, array in (('indptr', indptr), ('postings', postings), ('tf', tf), ('doc_len', doc_len)):
+        np.save(tmp / f'{name}.npy', array)
+    with open(tmp / 'vocab.json', 'w', encoding='utf-8') as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    with open(tmp / 'ids.json', 'w', encoding='utf-8') as f:
+        json.dump([d['id'] for d in docs], f)
+    meta = {'version': INDEX_VERSION, 'corpus': corpus_path, 'corpus_mtime': mtime,
+            'docs': len(docs), 'terms': len(vocab), 'built_at': time.time()}
+    with open(tmp / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    # Readers holding the old memory maps keep working until they reload
+    old = Path(f'{index_dir}.old')
+    shutil.rmtree(old, ignore_errors=True)
+    if Path(index_dir).exists():
+        os.replace(index_dir, old)
+    os.replace(tmp, index_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+
+class RetrievalIndex:
+    """BM25 lookup with a curated-answer fast path and grounding passages."""
+
+    def __init__(self, index_dir: str = INDEX_DIR, corpus_path: str = CORPUS_PATH,
+                 answer_threshold: float = 0.85, grounding_threshold: float = 0.25,
+                 top_k: int = 3, refresh_interval: float = 5.0, compact_fraction: float = 0.25):
+        self.index_dir = index_dir
+        self.corpus_path = corpus_path
+        self.answer_threshold = answer_threshold
+        self.grounding_threshold = grounding_threshold
+        self.top_k = top_k
+        self.refresh_interval = refresh_interval
+        self.compact_fraction = compact_fraction
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self.lookups = 0
+        self.answered = 0
+        self.grounded = 0
+        self.misses = 0
+        self.compactions = 0
+        self._open()
+
+    def _open(self):
+        meta_path = Path(self.index_dir) / 'meta.json'
+        meta = None
+        if meta_path.exists():
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        if meta is None or meta.get('version') != INDEX_VERSION:
+            meta = build_index(self.corpus_path, self.index_dir)
+        self._base = _Segment.load(self.index_dir)
+        self._base_rows = {doc_id: row for row, doc_id in enumerate(self._base.ids)}
+        self._delta = _Segment.from_docs([])
+        self._dead = np.zeros(self._base.n, dtype=bool)
+        self._corpus_mtime = meta['corpus_mtime']
+        self.refresh()
+
+    # ------------------------------------------------------------ updates
+
+    def refresh(self):
+        """Apply corpus edits since the index was built, compacting if the delta is large."""
+        try:
+            mtime = os.path.getmtime(self.corpus_path)
+        except OSError:
+            return
+        if mtime == self._corpus_mtime:
+            return
+        seen, new_docs = set(), []
+        for doc in read_corpus(self.corpus_path):
+            seen.add(doc['id'])
+            if doc['id'] not in self._base_rows:
+                new_docs.append(doc)
+        dead = np.fromiter((doc_id not in seen for doc_id in self._base.ids), dtype=bool, count=self._base.n)
+        if len(new_docs) + int(dead.sum()) > self.compact_fraction * max(1, self._base.n):
+            self.compact()
+            return
+        delta = _Segment.from_docs(new_docs)
+        with self._lock:
+            self._delta, self._dead, self._corpus_mtime = delta, dead, mtime
+
+    def compact(self):
+        """Rebuild the on-disk index from the current corpus and drop the delta."""
+        meta = build_index(self.corpus_path, self.index_dir)
+        base = _Segment.load(self.index_dir)
+        with self._lock:
+            self._base = base
+            self._base_rows = {doc_id: row for row, doc_id in enumerate(base.ids)}
+            self._delta = _Segment.from_docs([])
+            self._dead = np.zeros(base.n, dtype=bool)
+            self._corpus_mtime = meta['corpus_mtime']
+            self.compactions += 1
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        self.refresh()
+
+    # ------------------------------------------------------------ queries
+
+    def search(self, question: str, k: int = None) -> list:
+        """Top-k hits by BM25 across the base and delta segments."""
+        self._maybe_refresh()
+        k = k or self.top_k
+        query = Counter(analyze(question))
+        if not query:
+            return []
+        with self._lock:
+            base, delta, dead = self._base, self._delta, self._dead
+        n_docs = base.n + delta.n
+        if n_docs == 0:
+            return []
+        avgdl = (base.total_len + delta.total_len) / n_docs
+
+        idf, best = {}, 0.0
+        for term, count in query.items():
+            df = base.df(term) + delta.df(term)
+            idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            # A document can at most saturate every query term
+            best += idf[term] * (BM25_K1 + 1) * count
+
+        candidates = []
+        for segment, mask in ((base, dead), (delta, None)):
+            if segment.n == 0:
+                continue
+            scores = np.zeros(segment.n, dtype=np.float64)
+            for term, count in query.items():
+                found = segment.term_postings(term)
+                if found is None:
+                    continue
+                docs, tf = found
+                tf = tf.astype(np.float64)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.doc_len[docs] / avgdl)
+                scores[docs] += idf[term] * count * tf * (BM25_K1 + 1) / (tf + norm)
+            if mask is not None:
+                scores[mask] = 0.0
+            top = np.argsort(-scores)[:k]
+            candidates.extend((scores[i], segment, int(i)) for i in top if scores[i] > 0)
+
+        candidates.sort(key=lambda c: -c[0])
+        vector = ngram_vector(normalize_question(question))
+        hits = []
+        for score, segment, row in candidates[:k]:
+            doc = segment.docs[row]
+            similarity = _cosine(vector, ngram_vector(normalize_question(doc['instruction'])))
+            hits.append(Hit(doc['id'], doc['instruction'], doc['answer'], doc.get('category'),
+                            round(float(score) / best, 4), round(similarity, 4)))
+        return hits
+
+    def lookup(self, question: str, allow_answer: bool = True) -> Retrieval:
+        """Curated answer when the question matches closely enough, else grounding passages."""
+        hits = self.search(question)
+        match = None
+        if allow_answer:
+            candidates = sorted((h for h in hits if h.similarity >= self.answer_threshold),
+                                key=lambda h: -h.similarity)
+            match = next((h for h in candidates if same_terms(question, h.instruction)), None)
+        with self._lock:
+            self.lookups += 1
+            if match is not None:
+                self.answered += 1
+                return Retrieval(answer=match)
+            passages = tuple(h.answer for h in hits if h.relevance >= self.grounding_threshold
+                             and h.category not in UNGROUNDED_CATEGORIES)
+            if passages:
+                self.grounded += 1
+            else:
+                self.misses += 1
+            return Retrieval(passages=passages)
+
+    def stats(self) -> dict:
+        """Lookup outcome counters and index size."""
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'answered': self.answered,
+                'grounded': self.grounded,
+                'misses': self.misses,
+                'docs': self._base.n - int(self._dead.sum()) + self._delta.n,
+                'delta_docs': self._delta.n,
+                'tombstones': int(self._dead.sum()),
+                'compactions': self.compactions,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query the guidance retrieval index.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='(Re)build the on-disk index')
+    build.add_argument('--corpus', default=CORPUS_PATH)
+    build.add_argument('--index', default=INDEX_DIR)
+    query = sub.add_parser('query', help='Show hits and the lookup decision for a question')
+    query.add_argument('question')
+    query.add_argument('--corpus', default=CORPUS_PATH)
+    query.add_argument('--index', default=INDEX_DIR)
+    query.add_argument('-k', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        print(json.dumps(build_index(args.corpus, args.index), indent=2))
+        return
+    index = RetrievalIndex(args.index, args.corpus, top_k=args.k)
+    for hit in index.search(args.question):
+        print(f'{hit.relevance:.3f}  {hit.similarity:.3f}  {hit.instruction}')
+    result = index.lookup(args.question)
+    print('fast path' if result.answer else f'{len(result.passages)} grounding passage(s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Multi-turn conversation sessions with reusable KV caches.
+Each session keeps the token ids of the conversation so far and the
+past_key_values covering them, so a new turn only prefills its own tokens.
+Sessions are capped in context length and cached tokens, and evicted when idle.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from transformers import DynamicCache
+
+from prompts import END_OF_TURN, build_conversation, model_turn, user_turn, with_context
+
+
+class Session:
+    """Conversation state for one chat: turns, token ids and KV cache."""
+
+    def __init__(self, session_id: str = None):
+        self.session_id = session_id
+        self.turns = []
+        self.token_ids = []
+        self.past_key_values = None
+        self.adapter = None
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def cached_tokens(self) -> int:
+        if self.past_key_values is None:
+            return 0
+        return self.past_key_values.get_seq_length()
+
+
+class SessionStore:
+    """Bounded registry of sessions keyed by the UI's session id."""
+
+    def __init__(self, tokenizer, max_sessions: int = 64, idle_ttl_seconds: float = 1800,
+                 max_context_tokens: int = 2048, max_cached_tokens: int = 65536):
+        self.tokenizer = tokenizer
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_context_tokens = max_context_tokens
+        self.max_cached_tokens = max_cached_tokens
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._end_ids = self._encode(END_OF_TURN)
+        self.evictions = 0
+        self.truncations = 0
+
+    def get(self, session_id: str, history: list = None) -> Session:
+        """Return the session for an id, rebuilding it if it no longer matches history.
+
+        `history` is the list of (user, model) turns the UI is showing. A session
+        without an id is built from history and not retained. Callers that go on
+        to answer a turn should pass no history and `sync` under `session.lock`
+        instead, so a concurrent turn cannot slip in between.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(session_id) if session_id is not None else None
+            if session is None:
+                session = Session(session_id)
+                if session_id is not None:
+                    self._sessions[session_id] = session
+                    while len(self._sessions) > self.max_sessions:
+                        self._sessions.popitem(last=False)
+                        self.evictions += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+
+        if history is not None:
+            with session.lock:
+                self.sync(session, history)
+        return session
+
+    def sync(self, session: Session, history: list):
+        """Rebuild the session if it no longer matches history (caller holds session.lock)."""
+        turns = [tuple(turn) for turn in history]
+        if session.turns != turns:
+            self._rebuild(session, turns)
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def prepare_turn(self, session: Session, question: str, max_new_tokens: int, context=None) -> list:
+        """Return prompt ids for a new turn, sliding the window if over budget.
+
+        `context` passages are part of this turn's prompt only; history rebuilt
+        after truncation keeps just the question.
+        """
+        new_ids = self._encode(user_turn(with_context(question, context)))
+        while (session.turns and
+               len(session.token_ids) + len(new_ids) + max_new_tokens > self.max_context_tokens):
+            # Dropping the oldest turn shifts every position, so the cache restarts
+            self._rebuild(session, session.turns[1:])
+            self.truncations += 1
+        if not session.token_ids:
+            session.token_ids = self._bos()
+        if session.turns and session.past_key_values is None:
+            session.past_key_values = DynamicCache()
+        return session.token_ids + new_ids
+
+    def complete_turn(self, session: Session, question: str, prompt_ids: list,
+                      output_ids: list, answer: str):
+        """Record a generated turn; the KV cache already covers prompt + output."""
+        covered = len(prompt_ids) + len(output_ids)
+        session.token_ids = prompt_ids + output_ids + self._end_ids
+        if session.past_key_values is not None and session.cached_tokens > covered:
+            session.past_key_values.crop(covered)
+        session.turns.append((question, answer))
+        self._enforce_cache_budget(session)
+
+    def pin_adapter(self, session: Session, adapter: str):
+        """Bind a session to an adapter; its KV cache is only valid for the adapter that built it."""
+        if session.adapter != adapter:
+            session.adapter = adapter
+            session.past_key_values = None
+
+    def record_turn(self, session: Session, question: str, answer: str):
+        """Append a turn that was answered without generation (refusal, cache hit)."""
+        if not session.token_ids:
+            session.token_ids = self._bos()
+        session.token_ids = session.token_ids + self._encode(user_turn(question) + model_turn(answer))
+        session.turns.append((question, answer))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'cached_tokens': sum(s.cached_tokens for s in self._sessions.values()),
+                'evictions': self.evictions,
+                'truncations': self.truncations,
+            }
+
+    def _encode(self, text: str) -> list:
+        return self.tokenizer(text, add_special_tokens=False)['input_ids']
+
+    def _bos(self) -> list:
+        bos = self.tokenizer.bos_token_id
+        return [bos] if bos is not None else []
+
+    def _rebuild(self, session: Session, turns: list):
+        session.turns = list(turns)
+        session.token_ids = self._bos() + self._encode(build_conversation(turns)) if turns else []
+        session.past_key_values = None
+
+    def _evict_idle(self, now: float):
+        """Drop sessions idle past the TTL (caller holds the lock)."""
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def _enforce_cache_budget(self, current: Session):
+        """Release KV caches of least recently used sessions over the token budget."""
+        with self._lock:
+            total = sum(s.cached_tokens for s in self._sessions.values())
+            for session in list(self._sessions.values()):
+                if total <= self.max_cached_tokens:
+                    break
+                if session is current or session.past_key_values is None:
+                    continue
+                total -= session.cached_tokens
+                session.past_key_values = None
@@ -0,0 +1,38 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope='session')
+def tiny():
+    """Tiny randomly initialised Gemma and its tokenizer (no download)."""
+    from tiny_lm import build_tiny_lm
+
+    model, tokenizer = build_tiny_lm()
+    tokenizer.padding_side = 'left'
+    return model, tokenizer
+
+
+def eos_ids(tokenizer) -> list:
+    return [tokenizer.eos_token_id, tokenizer.convert_tokens_to_ids('<end_of_turn>')]
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    """The chat app on the tiny backend, generating greedily so outputs are comparable."""
+    os.environ['AUTISM_BACKEND'] = 'tiny'
+    os.environ.pop('AUTISM_ADAPTERS', None)
+    import app
+    from batching import BatchScheduler
+
+    app.answer_cache.path = None   # never persist test answers
+    model, tokenizer = app.manager.get()
+    app.scheduler = BatchScheduler(model, tokenizer, do_sample=False,
+                                   eos_token_id=eos_ids(tokenizer), use_cache=True)
+    yield app
+    app.scheduler.close()
@@ -0,0 +1,95 @@
+import pytest
+
+from adapters import BASE, AdapterRouter, hash_point, parse_adapter_spec
+
+
+def _router(spec):
+    return AdapterRouter(parse_adapter_spec(spec))
+
+
+def test_parse_spec_keeps_order_and_weights():
+    adapters = parse_adapter_spec('main=out/adapter:0.9, ckpt=out/checkpoint-102:0.1, base:0')
+    assert list(adapters) == ['main', 'ckpt', BASE]
+    assert adapters['ckpt'] == ('out/checkpoint-102', 0.1)
+    assert adapters[BASE] == (BASE, 0.0)
+
+
+@pytest.mark.parametrize('spec', ['base:1', 'main=a:-1', 'main=a:x', 'main=a,main=b', 'main'])
+def test_parse_spec_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_adapter_spec(spec)
+
+
+def test_session_routing_is_sticky():
+    router = _router('main=a:0.5,ckpt=b:0.5')
+    sessions = [f'session-{i}' for i in range(200)]
+    first = [router.route(s) for s in sessions]
+    assert [router.route(s) for s in reversed(sessions)] == first[::-1]
+    # A fresh router (e.g. after a restart) sends every chat to the same adapter
+    assert [_router('main=a:0.5,ckpt=b:0.5').route(s) for s in sessions] == first
+    assert set(first) == {'main', 'ckpt'}
+
+
+def test_routing_follows_weights():
+    router = _router('main=a:0.9,ckpt=b:0.1,base:0')
+    routed = [router.route(f'session-{i}') for i in range(2000)]
+    assert BASE not in routed
+    assert 0.05 < routed.count('ckpt') / len(routed) < 0.15
+    assert sum(router.describe()[i]['routed'] for i in range(3)) == 2000
+
+
+def test_sessions_keep_their_adapter_when_weight_is_added():
+    router = _router('main=a:1,ckpt=b:0')
+    sessions = [f'session-{i}' for i in range(500)]
+    assert {router.route(s) for s in sessions} == {'main'}
+    router.set_weights({'main': 0.8, 'ckpt': 0.2})
+    moved = [s for s in sessions if router.route(s) == 'ckpt']
+    # Only sessions whose point falls past 0.8 move to the new adapter
+    assert moved and all(hash_point(s) >= 0.8 for s in moved)
+
+
+def test_no_weight_falls_back_to_first_adapter():
+    router = _router('main=a:0,ckpt=b:0')
+    assert router.route('anything') == router.default == 'main'
+
+
+class _FakePeftModel:
+    def __init__(self):
+        self.calls = []
+
+    def set_adapter(self, name):
+        self.calls.append(name)
+
+    def load_adapter(self, path, adapter_name, local_files_only=False):
+        self.calls.append(('load', adapter_name))
+
+    def delete_adapter(self, name):
+        self.calls.append(('delete', name))
+
+
+def test_use_switches_adapter_only_when_it_changes():
+    router = _router('main=a:1,ckpt=b:0')
+    model = _FakePeftModel()
+    router.bind(model)
+    for name in ('main', 'main', 'ckpt', None):
+        with router.use(name):
+            pass
+    assert model.calls == ['main', 'ckpt', 'main']
+    with pytest.raises(KeyError):
+        with router.use('missing'):
+            pass
+
+
+def test_load_and_unload_at_runtime():
+    router = _router('main=a:1')
+    model = _FakePeftModel()
+    router.bind(model)
+    router.load('ckpt', 'b')
+    assert router.route('session') == 'main'   # loaded adapters get no traffic until weighted
+    with pytest.raises(ValueError):
+        router.load('ckpt', 'b')
+    router.unload('main')
+    assert router.names == ['ckpt']
+    with pytest.raises(ValueError):
+        router.unload('ckpt')
+    assert model.calls == [('load', 'ckpt'), ('delete', 'main')]
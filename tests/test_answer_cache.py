@@ -0,0 +1,52 @@
+import pytest
+
+from answer_cache import AnswerCache
+
+
+@pytest.mark.parametrize('cached, asked', [
+    ('What are early signs of autism in a 2-year-old?', 'What are early signs of autism in a 3-year-old?'),
+    ('My child does not respond to their name at 12 months', 'My child does not respond to their name at 18 months'),
+    ('My toddler has no eye contact, should I worry?', 'My toddler has eye contact, should I worry?'),
+    ('When should I worry about speech delay?', "When shouldn't I worry about speech delay?"),
+    ('Is it autism if my two year old lines up toys?', 'Is it autism if my three year old lines up toys?'),
+])
+def test_near_duplicate_needs_same_numbers_and_negations(cached, asked):
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put(cached, 'answer')
+    assert cache.get(asked) is None
+
+
+def test_near_duplicate_hit():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put('What are early signs of autism in a 2-year-old?', 'answer')
+    assert cache.get('what are the early signs of autism in a 2 year old') == 'answer'
+    assert cache.stats()['near_hits'] == 1
+
+
+def test_exact_hit_ignores_case_and_punctuation():
+    cache = AnswerCache(similarity_threshold=None)
+    cache.put('How is the M-CHAT used?', 'answer')
+    assert cache.get('how is the m chat used') == 'answer'
+
+
+def test_persisted_entries_are_tied_to_model(tmp_path):
+    path = str(tmp_path / 'answers.json')
+    old = AnswerCache(path=path, model_key='adapter-v1')
+    old.put('What is stimming?', 'old answer')
+    old.save()
+
+    assert AnswerCache(path=path, model_key='adapter-v1').load() == 1
+    fresh = AnswerCache(path=path, model_key='adapter-v2')
+    assert fresh.load() == 0
+    assert fresh.get('What is stimming?') is None
+
+
+def test_lru_eviction():
+    cache = AnswerCache(max_entries=2, similarity_threshold=None)
+    cache.put('first question', 'a')
+    cache.put('second question', 'b')
+    cache.get('first question')
+    cache.put('third question', 'c')
+    assert cache.get('second question') is None
+    assert cache.get('first question') == 'a'
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+import batching
+from batching import BatchScheduler, QueueFullError, generate_batch
+from conftest import eos_ids
+from prompts import build_prompt
+
+QUESTIONS = [
+    'What are early signs of autism?',
+    'How is the M-CHAT-R screening tool used in a pediatric visit for toddlers?',
+    'Does my child need speech therapy?',
+]
+
+
+def _ids(tokenizer, question):
+    return tokenizer(build_prompt(question))['input_ids']
+
+
+def _greedy(model, tokenizer, prompt_ids, max_new_tokens=12):
+    return generate_batch(model, tokenizer, prompt_ids, max_new_tokens,
+                          do_sample=False, eos_token_id=eos_ids(tokenizer))
+
+
+def test_batched_matches_unbatched_greedy(tiny):
+    model, tokenizer = tiny
+    prompts = [_ids(tokenizer, q) for q in QUESTIONS]
+    assert len({len(ids) for ids in prompts}) > 1   # rows really are left-padded
+    alone = [_greedy(model, tokenizer, [ids])[0] for ids in prompts]
+    assert _greedy(model, tokenizer, prompts) == alone
+
+
+def test_scheduler_batches_concurrent_requests(tiny):
+    model, tokenizer = tiny
+    alone = [tokenizer.decode(_greedy(model, tokenizer, [_ids(tokenizer, q)])[0],
+                              skip_special_tokens=True).strip() for q in QUESTIONS]
+    scheduler = BatchScheduler(model, tokenizer, max_batch_size=8, max_wait_ms=500,
+                               do_sample=False, eos_token_id=eos_ids(tokenizer))
+    try:
+        requests = [scheduler.submit(build_prompt(q), max_new_tokens=12) for q in QUESTIONS]
+        assert [r.result(timeout=60) for r in requests] == alone
+        assert max(r.batch_size for r in requests) > 1
+    finally:
+        scheduler.close()
+
+
+@pytest.fixture
+def blocked(monkeypatch):
+    """Make generation wait until the test releases it."""
+    release, started = threading.Event(), threading.Event()
+    real = batching.generate_batch
+
+    def gated(*args, **kwargs):
+        started.set()
+        release.wait(30)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(batching, 'generate_batch', gated)
+    yield started, release
+    release.set()
+
+
+def test_queue_full_rejects_new_requests(tiny, blocked):
+    model, tokenizer = tiny
+    started, release = blocked
+    scheduler = BatchScheduler(model, tokenizer, max_batch_size=1, max_queue_size=2,
+                               do_sample=False, eos_token_id=eos_ids(tokenizer))
+    try:
+        running = scheduler.submit(build_prompt(QUESTIONS[0]), max_new_tokens=4)
+        assert started.wait(30)
+        queued = [scheduler.submit(build_prompt(q), max_new_tokens=4) for q in QUESTIONS[1:]]
+        with pytest.raises(QueueFullError):
+            scheduler.submit(build_prompt(QUESTIONS[0]), max_new_tokens=4)
+        assert scheduler.queue_depth == 2
+        release.set()
+        for request in [running] + queued:
+            request.result(timeout=60)
+    finally:
+        scheduler.close()
+
+
+def test_generation_error_reaches_every_caller(tiny, monkeypatch):
+    model, tokenizer = tiny
+    scheduler = BatchScheduler(model, tokenizer, max_batch_size=8, max_wait_ms=500,
+                               do_sample=False, eos_token_id=eos_ids(tokenizer))
+    real = batching.generate_batch
+    try:
+        def broken(*args, **kwargs):
+            raise RuntimeError('CUDA out of memory')
+
+        monkeypatch.setattr(batching, 'generate_batch', broken)
+        requests = [scheduler.submit(build_prompt(q), max_new_tokens=4) for q in QUESTIONS]
+        for request in requests:
+            with pytest.raises(RuntimeError, match='out of memory'):
+                request.result(timeout=60)
+        with pytest.raises(RuntimeError, match='out of memory'):
+            list(requests[0])
+
+        # The worker survives and serves the next batch
+        monkeypatch.setattr(batching, 'generate_batch', real)
+        assert isinstance(scheduler.generate(build_prompt(QUESTIONS[0]), 4, timeout=60), str)
+    finally:
+        scheduler.close()
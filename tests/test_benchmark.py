@@ -0,0 +1,33 @@
+from benchmark import compare, load_prompts
+
+BASELINE = {'tokens_per_sec': 100.0, 'requests_per_sec': 10.0, 'ttft_ms': {'p50': 50.0},
+            'peak_vram_mb': 0.0}
+
+
+def _regressed(summary, tolerance=0.1):
+    return {r['metric'] for r in compare(summary, BASELINE, tolerance)}
+
+
+def test_throughput_falling_to_zero_regresses():
+    summary = dict(BASELINE, tokens_per_sec=0.0)
+    assert _regressed(summary) == {'tokens_per_sec'}
+
+
+def test_metric_no_longer_measured_regresses():
+    summary = dict(BASELINE, ttft_ms={'p50': None})
+    assert _regressed(summary) == {'ttft_ms.p50'}
+
+
+def test_within_tolerance_and_zero_baseline_pass():
+    summary = dict(BASELINE, tokens_per_sec=95.0, ttft_ms={'p50': 54.0}, peak_vram_mb=512.0)
+    assert _regressed(summary) == set()
+
+
+def test_latency_increase_regresses():
+    summary = dict(BASELINE, ttft_ms={'p50': 80.0})
+    assert _regressed(summary) == {'ttft_ms.p50'}
+
+
+def test_dataset_prompts_load_from_any_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert load_prompts('dataset', [])
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from conftest import ROOT
+from guardrails import ALLOWED, BLOCKED, OFF_TOPIC, GuardrailEngine
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return GuardrailEngine.from_file(str(ROOT / 'guardrails.json'))
+
+
+@pytest.mark.parametrize('question, rule', [
+    ('My autistic son gets meltdowns when the weather changes', 'autistic'),
+    ('Should I translate the M-CHAT for my Spanish-speaking family?', 'm-chat'),
+    ('My toddler laughs at every joke, is that social?', 'toddler'),
+])
+def test_in_domain_outweighs_off_topic_word(engine, question, rule):
+    assert engine.classify(question) == (ALLOWED, 'in_domain', rule)
+
+
+@pytest.mark.parametrize('question, rule', [
+    ('What is the weather tomorrow?', 'weather'),
+    ('Tell me a joke', 'joke'),
+    ('Give me a recipe for pancakes', 'recipe'),
+])
+def test_off_topic(engine, question, rule):
+    assert engine.classify(question) == (OFF_TOPIC, 'out_of_domain', rule)
+
+
+def test_no_rule_is_off_topic(engine):
+    assert engine.classify('Who won the game last night?') == (OFF_TOPIC, None, None)
+
+
+def test_block_outweighs_everything(engine):
+    verdict = engine.classify('Do vaccines cause autism in my child?')
+    assert verdict == (BLOCKED, 'block', 'vaccines cause autism')
+
+
+def test_whole_word_matching(engine):
+    # "kidney" must not match the in-domain rule "kid"
+    assert engine.classify('How do kidney stones form?').branch == OFF_TOPIC
+
+
+def test_hot_reload(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'in_domain': ['autism']}))
+    engine = GuardrailEngine.from_file(str(path), reload_interval=0)
+    assert engine.classify('a recipe for autism-friendly snacks').branch == ALLOWED
+    path.write_text(json.dumps({'block': ['recipe'], 'in_domain': ['autism']}))
+    engine._mtime = None   # mtime resolution can hide a same-second rewrite
+    assert engine.classify('a recipe for autism-friendly snacks').branch == BLOCKED
@@ -0,0 +1,19 @@
+import pytest
+
+import metrics
+
+
+def test_failed_generation_is_counted_as_error(app_module, monkeypatch):
+    app = app_module
+    monkeypatch.setattr(app.metrics, 'start_trace', metrics.RequestTrace)
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('generate failed')
+
+    monkeypatch.setattr('batching.generate_batch', broken)
+    before = metrics.REQUESTS._values.get(('error',), 0.0)
+    history = [('What is echolalia?', 'Repeating words or phrases heard from others.')]
+    with pytest.raises(RuntimeError):
+        for _ in app.safe_chat('Does echolalia in autism go away?', history, 'metrics-error'):
+            pass
+    assert metrics.REQUESTS._values.get(('error',), 0.0) == before + 1
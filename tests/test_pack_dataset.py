@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from evaluation import compute_packed_perplexity
+from pack_dataset import PackedDataset, collate_packed, pack_dataset
+
+SPLITS_DIR = 'data/splits'
+
+
+def _packed(tokenizer, tmp_path, seq_len=256):
+    pack_dataset(tokenizer, 'tiny', SPLITS_DIR, str(tmp_path), seq_len)
+    return PackedDataset(str(tmp_path), 'train'), PackedDataset(str(tmp_path), 'eval')
+
+
+def test_packed_splits_follow_the_manifest(tiny, tmp_path):
+    _, tokenizer = tiny
+    train, eval_ = _packed(tokenizer, tmp_path)
+    stats = train.meta['splits']
+    assert train.num_examples == stats['train']['weighted_examples']
+    assert eval_.num_examples == stats['eval']['weighted_examples']
+    # The first pass emits every unique example once, in shard order
+    first = eval_.example(0)
+    assert (first['labels'] == -100).any() and (first['labels'] != -100).any()
+
+
+def test_collate_pads_without_scoring_padding(tiny, tmp_path):
+    _, tokenizer = tiny
+    train, _ = _packed(tokenizer, tmp_path, seq_len=512)
+    rows = [train[0], train[len(train) - 1]]
+    batch = collate_packed(rows, tokenizer.pad_token_id)
+    width = max(len(row['input_ids']) for row in rows)
+    assert batch['input_ids'].shape == (2, width)
+    assert batch['attention_mask'].shape == (2, 1, width, width)
+    for row, item in enumerate(rows):
+        n = len(item['input_ids'])
+        assert (batch['labels'][row, n:] == -100).all()
+        assert (batch['attention_mask'][row, 0, :n, n:] < 0).all()   # no real token sees padding
+        assert batch['position_ids'][row, :n].tolist() == item['position_ids'].tolist()
+    # Position ids restart at every example packed into a sequence
+    assert (train[0]['position_ids'] == 0).sum() > 1
+
+
+@pytest.mark.parametrize('attention', ['sdpa', 'eager'])
+def test_packed_examples_do_not_attend_to_each_other(tiny, tmp_path, attention):
+    model, tokenizer = tiny
+    train, _ = _packed(tokenizer, tmp_path, seq_len=512)
+    rows = [train[0], train[1]]
+    batch = collate_packed(rows, tokenizer.pad_token_id)
+    original = model.config._attn_implementation
+    model.set_attn_implementation(attention)
+    try:
+        with torch.inference_mode():
+            packed = model(input_ids=batch['input_ids'], attention_mask=batch['attention_mask'],
+                           position_ids=batch['position_ids']).logits
+            for row, item in enumerate(rows):
+                starts = np.flatnonzero(item['position_ids'] == 0).tolist() + [len(item['input_ids'])]
+                assert len(starts) > 2
+                for start, end in zip(starts, starts[1:]):
+                    ids = torch.as_tensor(item['input_ids'][start:end]).unsqueeze(0)
+                    alone = model(input_ids=ids).logits[0]
+                    assert torch.allclose(packed[row, start:end], alone, atol=1e-4)
+    finally:
+        model.set_attn_implementation(original)
+
+
+def test_packed_perplexity_scores_each_example_alone(tiny, tmp_path):
+    model, tokenizer = tiny
+    _, eval_ = _packed(tokenizer, tmp_path)
+    losses = []
+    for index in range(3):
+        item = eval_.example(index)
+        ids = torch.as_tensor(item['input_ids']).unsqueeze(0)
+        labels = torch.as_tensor(item['labels'])
+        with torch.inference_mode():
+            logits = model(input_ids=ids).logits[0, :-1].float()
+        losses.append(F.cross_entropy(logits, labels[1:], ignore_index=-100).item())
+    expected = math.exp(sum(losses) / len(losses))
+    assert math.isclose(compute_packed_perplexity(model, eval_, limit=3, batch_size=2), expected, rel_tol=1e-3)
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+from conftest import ROOT
+from retrieval import RetrievalIndex
+
+CORPUS = ROOT / 'data' / 'autism_screening_guidance.jsonl'
+
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    return RetrievalIndex(str(tmp_path_factory.mktemp('index') / 'index'), str(CORPUS))
+
+
+@pytest.mark.parametrize('question', [
+    'What are early signs of autism in toddlers?',
+    'what are the early signs of autism in toddlers',
+    'Can autism be detected before age 2?',
+])
+def test_fast_path_for_same_question(index, question):
+    assert index.lookup(question).answer is not None
+
+
+@pytest.mark.parametrize('question', [
+    'Can autism be detected before age 5?',
+    "My 4-year-old doesn't point at things. Should I be concerned?",
+    "When should I not worry about my child's speech delay?",
+])
+def test_no_fast_path_when_numbers_or_negations_differ(index, question):
+    result = index.lookup(question)
+    assert result.answer is None
+    assert result.passages
+
+
+def test_follow_ups_never_take_fast_path(index):
+    assert index.lookup('What are early signs of autism in toddlers?', allow_answer=False).answer is None
+
+
+def test_refusal_templates_are_not_grounding(index):
+    for passage in index.lookup("What's the best recipe for chocolate cake today?", allow_answer=False).passages:
+        assert 'chocolate' not in passage.lower()
+
+
+def test_incremental_refresh(tmp_path):
+    corpus = tmp_path / 'corpus.jsonl'
+    lines = CORPUS.read_text(encoding='utf-8').splitlines(keepends=True)
+    corpus.write_text(''.join(lines), encoding='utf-8')
+    index = RetrievalIndex(str(tmp_path / 'index'), str(corpus), refresh_interval=0)
+
+    question = 'Does hand flapping at age 4 always mean autism?'
+    with open(corpus, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'instruction': question, 'output': 'Not on its own.', 'category': 'repetitive'}) + '\n')
+    os.utime(corpus, ns=(0, os.stat(corpus).st_mtime_ns + 1))
+    assert index.lookup(question).answer.answer == 'Not on its own.'
+    assert index.stats()['delta_docs'] == 1
+
+    corpus.write_text(''.join(lines[1:]), encoding='utf-8')
+    os.utime(corpus, ns=(0, os.stat(corpus).st_mtime_ns + 2))
+    assert index.lookup(json.loads(lines[0])['instruction']).answer is None
+    assert index.stats()['tombstones'] == 1
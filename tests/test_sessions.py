@@ -0,0 +1,91 @@
+import pytest
+
+from batching import generate_batch
+from conftest import eos_ids
+from sessions import SessionStore
+
+
+def _reply(app, question, session, max_new_tokens=16):
+    return ''.join(app.stream_response(question, max_new_tokens, session=session)).strip()
+
+
+def test_abandoned_stream_discards_kv_cache(app_module):
+    app = app_module
+    store = app.get_sessions()
+    session = store.get('abandoned')
+    first, follow_up = 'What is stimming?', 'Is it harmful for my toddler?'
+    with session.lock:
+        _reply(app, first, session)
+        stream = app.stream_response(follow_up, 16, session=session)
+        next(stream)
+        stream.close()   # the UI went away mid-reply
+        assert session.past_key_values is None
+        assert len(session.turns) == 1
+        resumed = _reply(app, follow_up, session)
+
+    fresh = store.get(None, session.turns[:1])
+    assert _reply(app, follow_up, fresh) == resumed
+
+
+def test_failed_generation_discards_kv_cache(app_module, monkeypatch):
+    app = app_module
+    session = app.get_sessions().get('failed')
+    with session.lock:
+        _reply(app, 'What is echolalia?', session)
+
+        def broken(*args, **kwargs):
+            raise RuntimeError('generate failed')
+
+        monkeypatch.setattr('batching.generate_batch', broken)
+        with pytest.raises(RuntimeError):
+            _reply(app, 'Does it go away?', session)
+        assert session.past_key_values is None
+        assert len(session.turns) == 1
+
+
+def test_cached_follow_up_matches_full_prefill(tiny):
+    model, tokenizer = tiny
+    store = SessionStore(tokenizer)
+
+    def turn(session, question):
+        prompt_ids = store.prepare_turn(session, question, 12)
+        output_ids = generate_batch(model, tokenizer, [prompt_ids], 12, past_key_values=session.past_key_values,
+                                    do_sample=False, eos_token_id=eos_ids(tokenizer))[0]
+        answer = tokenizer.decode(output_ids, skip_special_tokens=True).strip()
+        store.complete_turn(session, question, prompt_ids, output_ids, answer)
+        return output_ids
+
+    cached = store.get('kv')
+    turn(cached, 'What is stimming?')
+    turn(cached, 'Is it harmful for my toddler?')   # builds the cache
+    covered = cached.cached_tokens
+    assert covered > 0
+    follow_up = turn(cached, 'How can I help at home?')
+    assert cached.cached_tokens > covered
+
+    fresh = store.get(None, cached.turns[:2])
+    assert fresh.past_key_values is None
+    assert turn(fresh, 'How can I help at home?') == follow_up
+
+
+def _chat(app, question, history):
+    """Send one message through the UI handler; returns the reply without the disclaimer."""
+    for _, history in app.respond(question, history):
+        pass
+    return history[-1][1].removesuffix(app.DISCLAIMER)
+
+
+def test_follow_up_without_keywords_is_answered(app_module):
+    app = app_module
+    history = []
+    assert _chat(app, 'What are early signs of autism in toddlers?', history) != app.OFF_TOPIC_REPLY
+    assert _chat(app, 'And what about at 4?', history) != app.OFF_TOPIC_REPLY
+    # Block rules still apply mid-conversation
+    assert _chat(app, 'Do vaccines cause autism?', history) == app.MISINFORMATION_REPLY
+
+
+def test_refused_opening_keeps_domain_check(app_module):
+    app = app_module
+    history = []
+    assert _chat(app, 'What is the capital of France?', history) == app.OFF_TOPIC_REPLY
+    assert _chat(app, 'And what about at 4?', history) == app.OFF_TOPIC_REPLY
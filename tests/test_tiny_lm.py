@@ -0,0 +1,7 @@
+from tiny_lm import build_tiny_tokenizer
+
+
+def test_tokenizer_does_not_depend_on_working_directory(tiny, tmp_path, monkeypatch):
+    _, tokenizer = tiny
+    monkeypatch.chdir(tmp_path)
+    assert build_tiny_tokenizer().get_vocab() == tokenizer.get_vocab()
@@ -0,0 +1,83 @@
+"""
+Tiny stand-in causal LM for CPU load tests and smoke runs.
+Builds a randomly initialised Gemma-architecture model and a byte-level BPE
+tokenizer (trained in memory on the guidance corpus) without touching the Hub,
+so the serving path can be exercised without a GPU or model download.
+"""
+
+import json
+from pathlib import Path
+
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import GemmaConfig, GemmaForCausalLM, PreTrainedTokenizerFast
+
+ROOT = Path(__file__).resolve().parent
+DATASET_PATH = str(ROOT / 'data' / 'autism_screening_guidance.jsonl')
+SPECIAL_TOKENS = ['<pad>', '<eos>', '<bos>', '<unk>', '<start_of_turn>', '<end_of_turn>']
+
+
+def _corpus(dataset_path: str):
+    """Yield training text for the stand-in tokenizer."""
+    path = Path(dataset_path)
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    ex = json.loads(line)
+                    yield ex.get('instruction', '') + '\n' + ex.get('output', '')
+    yield 'user\nmodel\nWhat are early signs of autism in a 2-year-old?'
+
+
+def build_tiny_tokenizer(vocab_size: int = 1024,
+                         dataset_path: str = DATASET_PATH) -> PreTrainedTokenizerFast:
+    """Train a small byte-level BPE tokenizer with Gemma's special tokens."""
+    tok = Tokenizer(models.BPE(unk_token='<unk>'))
+    tok.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tok.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=SPECIAL_TOKENS,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        show_progress=False,
+    )
+    tok.train_from_iterator(_corpus(dataset_path), trainer=trainer)
+
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tok,
+        bos_token='<bos>',
+        eos_token='<eos>',
+        unk_token='<unk>',
+        pad_token='<eos>',
+        additional_special_tokens=['<start_of_turn>', '<end_of_turn>'],
+    )
+    return tokenizer
+
+
+def build_tiny_lm(hidden_size: int = 64, num_layers: int = 2, seed: int = 0,
+                  dataset_path: str = DATASET_PATH):
+    """Return (model, tokenizer) for a tiny randomly initialised Gemma."""
+    tokenizer = build_tiny_tokenizer(dataset_path=dataset_path)
+    torch.manual_seed(seed)
+    config = GemmaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 4,
+        num_hidden_layers=num_layers,
+        num_attention_heads=4,
+        num_key_value_heads=1,
+        head_dim=hidden_size // 4,
+        max_position_embeddings=2048,
+        pad_token_id=tokenizer.pad_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        bos_token_id=tokenizer.bos_token_id,
+    )
+    model = GemmaForCausalLM(config)
+    model.eval()
+    return model, tokenizer
+
+
+if __name__ == '__main__':
+    model, tokenizer = build_tiny_lm()
+    print(f'Tiny LM: {model.num_parameters():,} parameters, vocab {len(tokenizer)}')